@@ -1,8 +1,11 @@
 from django.contrib import admin, messages
+from django.core.exceptions import PermissionDenied
+from django.http import StreamingHttpResponse, HttpResponseRedirect
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
 from django.conf import settings
 from django.utils.html import format_html
 from django.templatetags.static import static
-from django.db.models import Prefetch
 
 from django.core.exceptions import ValidationError
 from django.utils.translation import get_language
@@ -41,7 +44,25 @@ from .models import (
     Characteristic,
     CharacteristicValue,
 )
-from .forms import CitySEOExportForm, CitySEOImportForm, CitySEOInlineFormModel, SEOInlineFormModel
+from seo.metadata import schedule_metadata_regeneration, schedule_city_metadata_regeneration
+from . import catalog_types
+from .forms import (
+    CitySEOExportForm,
+    CitySEOImportForm,
+    CitySEOInlineFormModel,
+    SEOInlineFormModel,
+    CitySEOStreamingExportForm,
+    CitySEOBulkImportForm,
+)
+from .city_seo import (
+    stream_city_seo_csv,
+    save_city_seo_import_file,
+    is_city_seo_import_file,
+    import_city_seo_file,
+    delete_city_seo_import_file,
+    InvalidImportFile,
+)
+from .tasks import import_city_seo_task
 
 
 class CatalogAbstractAdmin(ImportExportMixin, TranslatableAdmin):
@@ -51,80 +72,114 @@ class CatalogAbstractAdmin(ImportExportMixin, TranslatableAdmin):
     import_formats = [CSV]
     import_form_class = CitySEOImportForm
     export_form_class = CitySEOExportForm
+    change_list_template = "admin/products/city_seo/change_list.html"
 
     def get_export_queryset(self, request):
         return self.model.city_set.through.objects.order_by("entity")
         return super().get_export_queryset(request)
 
+    def get_urls(self):
+        info = self.opts.app_label, self.opts.model_name
+        return [
+            path(
+                "city-seo-export/",
+                self.admin_site.admin_view(self.city_seo_export_view),
+                name="%s_%s_city_seo_export" % info,
+            ),
+            path(
+                "city-seo-import/",
+                self.admin_site.admin_view(self.city_seo_import_view),
+                name="%s_%s_city_seo_import" % info,
+            ),
+        ] + super().get_urls()
+
+    def city_seo_export_view(self, request):
+        if not self.has_export_permission(request):
+            raise PermissionDenied
+
+        CitySEOModel = self.model.city_set.through
+        form = CitySEOStreamingExportForm(
+            request.GET or None, city_queryset=CitySEOModel.city.get_queryset().order_by("name")
+        )
+        if form.is_bound and form.is_valid():
+            resource = self.get_export_resource_classes(request)[0]()
+            rows = stream_city_seo_csv(
+                CitySEOModel, resource, cities=form.cleaned_data["cities"], lang=form.cleaned_data["lang"]
+            )
+            response = StreamingHttpResponse(rows, content_type="text/csv; charset=utf-8")
+            filename = f"{self.opts.model_name}-city-seo-{form.cleaned_data['lang'] or 'all'}.csv"
+            response["Content-Disposition"] = f'attachment; filename="{filename}"'
+            return response
+
+        context = {
+            **self.admin_site.each_context(request),
+            "opts": self.opts,
+            "form": form,
+            "title": "Экспорт SEO по городам",
+        }
+        return TemplateResponse(request, "admin/products/city_seo/export.html", context)
+
+    def city_seo_import_view(self, request):
+        if not self.has_import_permission(request):
+            raise PermissionDenied
+
+        CitySEOModel = self.model.city_set.through
+        changelist_url = reverse(f"admin:{self.opts.app_label}_{self.opts.model_name}_changelist")
+        path = request.POST.get("import_path")
+        if request.method == "POST" and "cancel" in request.POST:
+            delete_city_seo_import_file(path)
+            return HttpResponseRedirect(changelist_url)
+        if request.method == "POST" and is_city_seo_import_file(path):
+            import_city_seo_task.delay(CitySEOModel._meta.label, path)
+            self.message_user(request, "Импорт SEO по городам запущен в фоне", messages.INFO)
+            return HttpResponseRedirect(changelist_url)
+
+        form = CitySEOBulkImportForm(request.POST or None, request.FILES or None)
+        summary = None
+        if form.is_bound and form.is_valid():
+            path = save_city_seo_import_file(form.cleaned_data["import_file"])
+            try:
+                summary = import_city_seo_file(CitySEOModel, path)
+            except InvalidImportFile as e:
+                form.add_error("import_file", str(e))
+
+        context = {
+            **self.admin_site.each_context(request),
+            "opts": self.opts,
+            "form": form,
+            "summary": summary,
+            "import_path": path,
+            "title": "Импорт SEO по городам",
+        }
+        return TemplateResponse(request, "admin/products/city_seo/import.html", context)
+
     @admin.action(description="Сгенерировать метаданные")
     def generate_metadata(self, request, qs):
-        SEOModel = self.model.seo.related.related_model
-        rule = SEOModel.get_default_seo_generation_rule()
-        for entity in qs:
-            seo = entity.seo
-            seo.set_seo_generation_rule(rule)
-            for translation in seo.translations.all():
-                lang = translation.language_code
-                entity.set_current_language(lang)
-                title = seo.generate_seo_title_by_entity(entity)
-                description = seo.generate_seo_description_by_entity(entity)
-
-                if translation.title == title and translation.description == description:
-                    continue
-
-                translation.title = title
-                translation.description = description
-                translation.save()
+        result = schedule_metadata_regeneration(self.catalog_type, qs.values_list("pk", flat=True))
+        if result is None:
+            self.message_user(request, "Генерация метаданных поставлена в очередь и выполнится в фоне", messages.INFO)
+            return
 
         self.message_user(
             request,
-            f"Метаданные сгенерированны",
+            f"Метаданные сгенерированы: обновлено {result['updated']}, создано {result['created']}, "
+            f"без изменений {result['unchanged']}",
             messages.SUCCESS,
         )
 
     @admin.action(description="Сгенерировать метаданные по городам")
     def generate_city_metadata(self, request, qs):
-        SEOModel = self.model.city_set.through
-        rule = SEOModel.get_default_seo_generation_rule()
-        full_changes_list = []
-        title_changes_list = []
-        description_changes_list = []
-        qs = qs.prefetch_related(
-            Prefetch("city_seo_set", queryset=self.model.city_set.through.objects.select_related("city")),
-            "translations",
-        )
-        for entity in qs:
-            for seo in entity.city_seo_set.all():
-                lang = seo.city.lang
-                entity.set_current_language(lang)
-                city = seo.city.name
-                seo.set_seo_generation_rule(rule)
-                title = seo.generate_seo_title_by_entity(entity, city)
-                description = seo.generate_seo_description_by_entity(entity, city)
-
-                if seo.title == title and seo.description == description:
-                    continue
-                elif seo.title != title and seo.description != description:
-                    seo.title = title
-                    seo.description = description
-                    full_changes_list.append(seo)
-                elif seo.title != title and seo.description == description:
-                    seo.title = title
-                    title_changes_list.append(seo)
-                elif seo.title == title and seo.description != description:
-                    seo.description = description
-                    description_changes_list.append(seo)
-
-        if len(full_changes_list) > 0:
-            result = SEOModel.objects.bulk_update(full_changes_list, ["title", "description"])
-        if len(title_changes_list) > 0:
-            result = SEOModel.objects.bulk_update(title_changes_list, ["title"])
-        if len(description_changes_list) > 0:
-            result = SEOModel.objects.bulk_update(description_changes_list, ["description"])
+        result = schedule_city_metadata_regeneration(self.catalog_type, qs.values_list("pk", flat=True))
+        if result is None:
+            self.message_user(
+                request, "Генерация метаданных для городов поставлена в очередь и выполнится в фоне", messages.INFO
+            )
+            return
 
         self.message_user(
             request,
-            f"Метаданные для городов сгенерированны",
+            f"Метаданные для городов сгенерированы: обновлено {result['updated']}, "
+            f"без изменений {result['unchanged']}",
             messages.SUCCESS,
         )
 
@@ -355,6 +410,7 @@ class ProductAdmin(CatalogAbstractAdmin):
         ProductSEOInline,
     )
     city_seo_inline = CityProductSEOInline
+    catalog_type = catalog_types.PRODUCT
     filter_horizontal = (
         "sub_categories",
         "tags",
@@ -414,6 +470,7 @@ class SubCategoryAdmin(CatalogAbstractAdmin):
         CategorySEOInline,
     )
     city_seo_inline = CityCategorySEOInline
+    catalog_type = catalog_types.CATEGORY
 
     def get_export_resource_classes(self, request):
         return [CategoryCitySEOExportResource]
@@ -451,6 +508,7 @@ class TagAdmin(CatalogAbstractAdmin):
         TagSEOInline,
     )
     city_seo_inline = CityTagSEOInline
+    catalog_type = catalog_types.TAG
 
     def get_export_resource_classes(self, request):
         return [TagCitySEOExportResource]
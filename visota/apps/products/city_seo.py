@@ -0,0 +1,212 @@
+import csv
+import io
+import re
+import uuid
+from datetime import timedelta
+from itertools import islice
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db.models import F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from common.utils import csv_safe, csv_unsafe
+from seo.changes import change_key, record_changes
+from .resources import ProductCitySEOImportResource, CategoryCitySEOImportResource, TagCitySEOImportResource
+
+CHUNK_SIZE = 2000
+MAX_REPORTED_ERRORS = 100
+IMPORT_DIR = "imports/city_seo"
+IMPORT_PATH_RE = re.compile(rf"^{IMPORT_DIR}/[0-9a-f]{{32}}\.csv$")
+
+IMPORT_RESOURCES = {
+    resource._meta.model: resource
+    for resource in (ProductCitySEOImportResource, CategoryCitySEOImportResource, TagCitySEOImportResource)
+}
+
+
+class Echo:
+    """
+    Псевдо-буфер для csv.writer: возвращает строку вместо записи
+    """
+
+    def write(self, value):
+        return value
+
+
+def _entity_name(EntityModel, lang):
+    EntityTranslation = EntityModel._parler_meta.root_model
+    return Subquery(
+        EntityTranslation.objects.filter(master_id=OuterRef("entity_id"), language_code=lang).values("name")[:1]
+    )
+
+
+def city_seo_export_rows(CitySEOModel, fields, cities=None, lang=None):
+    """
+    Строки SEO по городам кортежами в порядке fields.
+    Названия сущности и города подтягиваются в том же запросе. Строки читаются страницами по CHUNK_SIZE,
+    следующая страница - по (entity_id, id) после последней строки: курсор не держится открытым всю выгрузку.
+    """
+    EntityModel = CitySEOModel.entity.field.related_model
+    qs = CitySEOModel.objects.order_by("entity_id", "id")
+    if cities:
+        qs = qs.filter(city__in=cities)
+    if lang:
+        qs = qs.filter(city__lang=lang)
+
+    qs = qs.annotate(
+        entity_name=Coalesce(
+            _entity_name(EntityModel, OuterRef("city__lang")), _entity_name(EntityModel, settings.LANGUAGE_CODE)
+        ),
+        city_name=F("city__name"),
+    )
+    columns = {"entity": "entity_name", "city": "city_name"}
+    qs = qs.values_list("entity_id", "id", *[columns.get(field, field) for field in fields])
+    page = qs
+    while rows := list(page[:CHUNK_SIZE]):
+        for row in rows:
+            yield row[2:]
+        entity_id, pk = rows[-1][:2]
+        page = qs.filter(Q(entity_id__gt=entity_id) | Q(entity_id=entity_id, id__gt=pk))
+
+
+def stream_city_seo_csv(CitySEOModel, resource, cities=None, lang=None):
+    fields = resource._meta.fields
+    writer = csv.writer(Echo())
+    yield writer.writerow([resource.fields[field].column_name for field in fields])
+    for row in city_seo_export_rows(CitySEOModel, fields, cities=cities, lang=lang):
+        yield writer.writerow([csv_safe(value) for value in row])
+
+
+# import
+class InvalidImportFile(Exception):
+    pass
+
+
+def iter_chunks(iterable, size=CHUNK_SIZE):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def read_city_seo_csv(file):
+    """
+    Строки CSV файла словарями вместе с номером строки, файл читается потоково
+    """
+    reader = csv.DictReader(io.TextIOWrapper(file, encoding="utf-8-sig", newline=""))
+    for row in reader:
+        yield reader.line_num, row
+
+
+def _clean_row(CitySEOModel, resource, fields, row):
+    values = {}
+    for field in fields:
+        resource_field = resource.fields[field]
+        if resource_field.column_name not in row:
+            raise ValueError(f"Нет колонки {resource_field.column_name}")
+        value = resource_field.widget.clean(csv_unsafe(row[resource_field.column_name]), row=row)
+        if value == "" and CitySEOModel._meta.get_field(field).null:
+            value = None
+        values[field] = value
+    return values
+
+
+def import_city_seo_rows(CitySEOModel, resource, rows, apply=False):
+    """
+    Сравнение строк CSV с существующими записями SEO по городам по id.
+    С apply=True изменения сохраняются через bulk_update частями по CHUNK_SIZE строк.
+    Возвращает количество измененных, неизмененных и ошибочных строк.
+    """
+    id_column = resource.fields["id"].column_name
+    fields = [field for field in resource._meta.fields if field != "id"]
+    summary = {"changed": 0, "unchanged": 0, "invalid": 0, "errors": []}
+    # id -> строка, где он встретился впервые: повторы в файле отклоняются, а не перезаписывают друг друга
+    seen = {}
+
+    def invalid(line, error):
+        summary["invalid"] += 1
+        if len(summary["errors"]) < MAX_REPORTED_ERRORS:
+            summary["errors"].append(f"Строка {line}: {error}")
+
+    for chunk in iter_chunks(rows):
+        parsed = {}
+        for line, row in chunk:
+            pk = row.get(id_column) or ""
+            if not pk.strip().isdigit():
+                invalid(line, f"некорректный id {pk}")
+                continue
+            pk = int(pk)
+            if pk in seen:
+                invalid(line, f"id {pk} уже встречается в строке {seen[pk]}")
+                continue
+            seen[pk] = line
+            try:
+                parsed[pk] = (line, _clean_row(CitySEOModel, resource, fields, row))
+            except ValueError as e:
+                invalid(line, e)
+
+        existing = CitySEOModel.objects.only(*fields).in_bulk(parsed.keys())
+        changed = []
+        for pk, (line, values) in parsed.items():
+            obj = existing.get(pk)
+            if obj is None:
+                invalid(line, f"запись с id {pk} не найдена")
+                continue
+            if all(getattr(obj, field) == value for field, value in values.items()):
+                summary["unchanged"] += 1
+                continue
+            for field, value in values.items():
+                setattr(obj, field, value)
+            changed.append(obj)
+
+        summary["changed"] += len(changed)
+        if apply and changed:
+            CitySEOModel.objects.bulk_update(changed, fields)
+            record_changes(change_key(obj) for obj in changed)
+
+    return summary
+
+
+def save_city_seo_import_file(file):
+    return default_storage.save(f"{IMPORT_DIR}/{uuid.uuid4().hex}.csv", file)
+
+
+def is_city_seo_import_file(path):
+    return bool(IMPORT_PATH_RE.match(path or "")) and default_storage.exists(path)
+
+
+def delete_city_seo_import_file(path):
+    if is_city_seo_import_file(path):
+        default_storage.delete(path)
+
+
+def import_city_seo_file(CitySEOModel, path, apply=False):
+    """
+    Без apply только сравнение для предпросмотра, с apply - сохранение изменений.
+    Файл удаляется после применения, а также если он не читается или применять в нем нечего.
+    """
+    resource = IMPORT_RESOURCES[CitySEOModel]()
+    try:
+        with default_storage.open(path, "rb") as file:
+            summary = import_city_seo_rows(CitySEOModel, resource, read_city_seo_csv(file), apply=apply)
+    except (UnicodeDecodeError, csv.Error) as e:
+        default_storage.delete(path)
+        raise InvalidImportFile(f"Файл не читается как CSV в UTF-8: {e}") from e
+    if apply or not summary["changed"]:
+        default_storage.delete(path)
+    return summary
+
+
+def sweep_city_seo_import_files():
+    """
+    Удаляет загруженные файлы, которые так и не применили за CITY_SEO_IMPORT_FILE_TTL секунд
+    """
+    if not default_storage.exists(IMPORT_DIR):
+        return 0
+    expired_before = timezone.now() - timedelta(seconds=settings.CITY_SEO_IMPORT_FILE_TTL)
+    deleted = 0
+    for name in default_storage.listdir(IMPORT_DIR)[1]:
+        path = f"{IMPORT_DIR}/{name}"
+        if IMPORT_PATH_RE.match(path) and default_storage.get_modified_time(path) < expired_before:
+            default_storage.delete(path)
+            deleted += 1
+    return deleted
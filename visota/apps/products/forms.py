@@ -1,4 +1,5 @@
 from django import forms
+from django.conf import settings
 from import_export.forms import ImportExportFormBase, ImportForm, ExportForm
 from parler.forms import TranslatableModelForm
 from .mixins import CleanMetaDataModelFormMixin
@@ -77,3 +78,18 @@ class CitySEOImportForm(ImportForm, CitySEOImportExportFormBase):
 
 class CitySEOExportForm(ExportForm, CitySEOImportExportFormBase):
     pass
+
+
+class CitySEOStreamingExportForm(forms.Form):
+    cities = forms.ModelMultipleChoiceField(
+        label="города", queryset=None, required=False, help_text="если не выбраны, выгружаются все города"
+    )
+    lang = forms.ChoiceField(label="язык", choices=(("", "все"),) + settings.LANGUAGES, required=False)
+
+    def __init__(self, *args, city_queryset, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields["cities"].queryset = city_queryset
+
+
+class CitySEOBulkImportForm(forms.Form):
+    import_file = forms.FileField(label="CSV Файл", widget=forms.FileInput(attrs={"accept": ".csv"}))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from apps.products.snapshot import write_catalog_snapshot
+
+
+class Command(BaseCommand):
+    help = "Выгрузка всего каталога товаров в gzip NDJSON (по умолчанию в CATALOG_SNAPSHOT_ROOT)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output", help="Путь к файлу выгрузки")
+        parser.add_argument("--chunk-size", type=int, help="Товаров в одной пачке запросов")
+        parser.add_argument("--async", action="store_true", dest="run_async", help="Запустить в celery")
+
+    def handle(self, *args, output=None, chunk_size=None, run_async=False, **options):
+        if run_async:
+            from apps.products.tasks import build_catalog_snapshot_task
+
+            build_catalog_snapshot_task.delay()
+            self.stdout.write("Выгрузка каталога поставлена в очередь")
+            return
+
+        stats = write_catalog_snapshot(output, chunk_size)
+        seconds = max(stats["seconds"], 0.001)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Выгружено товаров: {stats['products']}, {stats['bytes'] / 1024:.1f} КБ "
+                f"за {stats['seconds']:.2f} с ({stats['products'] / seconds:.0f} товаров/с)"
+            )
+        )
@@ -0,0 +1,151 @@
+import gzip
+import json
+import os
+import time
+from collections import defaultdict
+from itertools import islice
+from django.conf import settings
+from seo.models import SEOProductPage
+from .models import (
+    Product,
+    SubCategory,
+    Tag,
+    Characteristic,
+    CharacteristicValue,
+    ProductCharacteristic,
+    ProductImg,
+    ProductDoc,
+)
+
+PRODUCT_FIELDS = ("name", "slug", "description", "priority", "last_modified")
+SEO_FIELDS = ("title", "description", "noindex_follow", "change_freq", "priority")
+
+
+def snapshot_path():
+    return os.path.join(settings.CATALOG_SNAPSHOT_ROOT, settings.CATALOG_SNAPSHOT_FILE)
+
+
+def translations_map(Model, ids=None, fields=("name", "slug")):
+    """
+    {id: {язык: {поле: значение}}} по таблице переводов модели
+    """
+    qs = Model._parler_meta.root_model.objects.all()
+    if ids is not None:
+        qs = qs.filter(master_id__in=ids)
+    result = defaultdict(dict)
+    for master_id, lang, *values in qs.values_list("master_id", "language_code", *fields).iterator():
+        result[master_id][lang] = dict(zip(fields, values))
+    return result
+
+
+def _grouped(qs, key, *fields):
+    result = defaultdict(list)
+    for row in qs.values_list(key, *fields).iterator():
+        result[row[0]].append(row[1:])
+    return result
+
+
+class CatalogDictionaries:
+    """
+    Справочники категорий, тегов и характеристик. Их на порядки меньше, чем товаров,
+    поэтому они загружаются один раз, а не для каждой пачки товаров.
+    """
+
+    def __init__(self):
+        self.categories = translations_map(SubCategory)
+        self.category_groups = dict(SubCategory.objects.values_list("id", "category_id"))
+        self.tags = translations_map(Tag)
+        self.characteristics = translations_map(Characteristic)
+        self.values = translations_map(CharacteristicValue)
+
+    def category(self, pk):
+        return {"id": pk, "group_id": self.category_groups.get(pk), "translations": self.categories.get(pk, {})}
+
+    def tag(self, pk):
+        return {"id": pk, "translations": self.tags.get(pk, {})}
+
+    def characteristic(self, characteristic_id, value_id):
+        return {
+            "characteristic": {
+                "id": characteristic_id,
+                "translations": self.characteristics.get(characteristic_id, {}),
+            },
+            "value": {"id": value_id, "translations": self.values.get(value_id, {})},
+        }
+
+
+def product_records(products, dictionaries):
+    """
+    Записи выгрузки для пачки товаров, связанные данные выбираются одним запросом на таблицу
+    """
+    ids = [product[0] for product in products]
+    translations = translations_map(Product, ids, PRODUCT_FIELDS)
+    seo = translations_map(SEOProductPage, ids, SEO_FIELDS)
+    categories = _grouped(
+        Product.sub_categories.through.objects.filter(product_id__in=ids), "product_id", "subcategory_id"
+    )
+    tags = _grouped(Product.tags.through.objects.filter(product_id__in=ids), "product_id", "tag_id")
+    characteristics = _grouped(
+        ProductCharacteristic.objects.filter(product_id__in=ids).order_by("id"),
+        "product_id",
+        "characteristic_id",
+        "characteristic_value_id",
+    )
+    images = _grouped(ProductImg.objects.filter(product_id__in=ids), "product_id", "img_url")
+    docs = _grouped(ProductDoc.objects.filter(product_id__in=ids).order_by("id"), "product_id", "id")
+    doc_translations = translations_map(
+        ProductDoc, [doc for rows in docs.values() for doc, in rows], ("file_name", "url")
+    )
+
+    for pk, code, actual_price, current_price, is_present, views in products:
+        yield {
+            "id": pk,
+            "code": code,
+            "actual_price": actual_price,
+            "current_price": current_price,
+            "is_present": is_present,
+            "views": views,
+            "translations": translations.get(pk, {}),
+            "categories": [dictionaries.category(category_id) for category_id, in categories.get(pk, [])],
+            "tags": [dictionaries.tag(tag_id) for tag_id, in tags.get(pk, [])],
+            "characteristics": [dictionaries.characteristic(*row) for row in characteristics.get(pk, [])],
+            "images": [img_url for img_url, in images.get(pk, [])],
+            "docs": [{"id": doc, "translations": doc_translations.get(doc, {})} for doc, in docs.get(pk, [])],
+            "seo": seo.get(pk),
+        }
+
+
+def iter_catalog(chunk_size=None):
+    """
+    Все товары по возрастанию id. Товары читаются iterator() пачками по CATALOG_SNAPSHOT_CHUNK_SIZE,
+    в памяти одновременно только одна пачка.
+    """
+    chunk_size = chunk_size or settings.CATALOG_SNAPSHOT_CHUNK_SIZE
+    dictionaries = CatalogDictionaries()
+    products = (
+        Product.objects.order_by("id")
+        .values_list("id", "code", "actual_price", "current_price", "is_present", "views")
+        .iterator(chunk_size=chunk_size)
+    )
+    while chunk := list(islice(products, chunk_size)):
+        yield from product_records(chunk, dictionaries)
+
+
+def write_catalog_snapshot(path=None, chunk_size=None):
+    """
+    Выгрузка каталога в gzip NDJSON, по товару на строку.
+    Файл пишется во временный и подменяется через os.replace.
+    Возвращает количество товаров, размер файла в байтах и время выгрузки в секундах.
+    """
+    path = path or snapshot_path()
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    started = time.monotonic()
+    count = 0
+    tmp_path = f"{path}.tmp"
+    with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+        for record in iter_catalog(chunk_size):
+            f.write(json.dumps(record, ensure_ascii=False, default=str))
+            f.write("\n")
+            count += 1
+    os.replace(tmp_path, path)
+    return {"products": count, "bytes": os.path.getsize(path), "seconds": time.monotonic() - started}
@@ -0,0 +1,19 @@
+from django.apps import apps
+from visota.celery import app
+from .city_seo import import_city_seo_file, sweep_city_seo_import_files
+from .snapshot import write_catalog_snapshot
+
+
+@app.task
+def import_city_seo_task(model_label, path):
+    return import_city_seo_file(apps.get_model(model_label), path, apply=True)
+
+
+@app.task
+def sweep_city_seo_import_files_task():
+    return sweep_city_seo_import_files()
+
+
+@app.task
+def build_catalog_snapshot_task():
+    return write_catalog_snapshot()
@@ -38,8 +38,8 @@ class ProductApi(viewsets.ReadOnlyModelViewSet, FilterMixin):
         except Http404:
             active_slug = get_object_or_404(ProductRedirectFrom, lang=get_language(), old_slug=slug)
             return redirect(f"/{active_slug.to.slug}/", permanent=True)
-        instance.views = F("views") + 1
-        instance.save()
+        # счетчик без save(): сохранение модели попадало бы в журнал изменений и вебхук фронтенда
+        Product.objects.filter(pk=instance.pk).update(views=F("views") + 1)
         serializer = self.get_serializer(instance)
         return Response(serializer.data)
 
@@ -1,18 +1,83 @@
 from django.contrib import admin
 from django import forms
+from django.db import transaction
+from django.db.models import Sum
+from django.http import StreamingHttpResponse
+from django.utils import timezone
 
 from .models import *
-
-
-class ConsultationRequestAdmin(admin.ModelAdmin):
+from .export import export_rows, stream_csv, stream_xlsx
+from .stats import apply_deltas, record_submissions, submission_deltas
+
+
+class RequestStatsMixin:
+    """
+    Дневная статистика при изменении заявок в админке: удаленные заявки вычитаются,
+    измененные пересчитываются (старые значения вычитаются, новые прибавляются).
+    Новые заявки учитывает сигнал post_save, кроме заказов: их товары сохраняются после заказа, в save_related.
+    """
+
+    def save_model(self, request, obj, form, change):
+        if change:
+            obj._stats_deltas = submission_deltas(self.model, [obj.pk])
+        super().save_model(request, obj, form, change)
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        obj = form.instance
+        if change:
+            apply_deltas(*obj._stats_deltas, subtract=True)
+            record_submissions(self.model, [obj.pk])
+        elif self.model is Order:
+            record_submissions(self.model, [obj.pk])
+
+    def delete_model(self, request, obj):
+        with transaction.atomic():
+            deltas = submission_deltas(self.model, [obj.pk])
+            super().delete_model(request, obj)
+            apply_deltas(*deltas, subtract=True)
+
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            deltas = submission_deltas(self.model, queryset.values_list("id", flat=True))
+            super().delete_queryset(request, queryset)
+            apply_deltas(*deltas, subtract=True)
+
+
+class RequestExportMixin:
+    """
+    Выгрузка выбранных заявок потоком: строки читаются из базы частями и сразу уходят в ответ
+    """
+
+    actions = ["export_csv", "export_xlsx"]
+
+    def _export_response(self, queryset, stream, content_type, extension):
+        header, rows = export_rows(queryset)
+        filename = f"{self.model._meta.model_name}-{timezone.localdate():%Y-%m-%d}.{extension}"
+        response = StreamingHttpResponse(stream(header, rows), content_type=content_type)
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
+
+    @admin.action(description="Экспорт в CSV")
+    def export_csv(self, request, queryset):
+        return self._export_response(queryset, stream_csv, "text/csv; charset=utf-8", "csv")
+
+    @admin.action(description="Экспорт в XLSX")
+    def export_xlsx(self, request, queryset):
+        return self._export_response(
+            queryset, stream_xlsx, "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "xlsx"
+        )
+
+
+class ConsultationRequestAdmin(RequestStatsMixin, RequestExportMixin, admin.ModelAdmin):
     list_display = ["name", "number", "date"]
 
 
-class OfferRequestAdmin(admin.ModelAdmin):
+class OfferRequestAdmin(RequestStatsMixin, RequestExportMixin, admin.ModelAdmin):
     list_display = ["name", "number", "date"]
 
 
-class PriceRequestAdmin(admin.ModelAdmin):
+class PriceRequestAdmin(RequestStatsMixin, RequestExportMixin, admin.ModelAdmin):
     list_display = ["name", "number", "date"]
 
 
@@ -44,17 +109,76 @@ class ProductsInline(admin.TabularInline):
 #         )
 
 
-class OrderAdmin(admin.ModelAdmin):
+class OrderAdmin(RequestStatsMixin, RequestExportMixin, admin.ModelAdmin):
     list_display = ["name", "number", "date"]
     inlines = [ProductsInline]
 
 
-class SampleRequestAdmin(admin.ModelAdmin):
+class SampleRequestAdmin(RequestStatsMixin, RequestExportMixin, admin.ModelAdmin):
     list_display = ["name", "number", "date"]
 
 
+class NotificationOutboxAdmin(admin.ModelAdmin):
+    """
+    Очередь писем о заявках: здесь видны письма, которые не удалось отправить (attempts, last_error)
+    """
+
+    list_display = ("model_label", "object_id", "queued_at", "attempts", "last_error")
+    list_filter = ("model_label",)
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+class RequestStatsAdmin(admin.ModelAdmin):
+    """
+    Отчет по заявкам только из таблиц дневной статистики, без подсчета по самим заявкам.
+    Статистика следит за заявками, созданными через API и измененными или удаленными в админке;
+    изменения в обход админки (shell, queryset.delete()) исправляет только rebuild_request_stats.
+    """
+
+    change_list_template = "admin/requests/stats/change_list.html"
+    date_hierarchy = "day"
+    list_filter = ("request_type",)
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def changelist_view(self, request, extra_context=None):
+        response = super().changelist_view(request, extra_context)
+        cl = getattr(response, "context_data", {}).get("cl")
+        if cl is not None:
+            response.context_data["totals"] = cl.queryset.aggregate(
+                requests=Sum("requests"), items=Sum("items"), revenue=Sum("revenue")
+            )
+        return response
+
+
+class DailyRequestStatsAdmin(RequestStatsAdmin):
+    list_display = ("day", "request_type", "requests", "items", "revenue")
+
+
+class DailyProductRequestStatsAdmin(RequestStatsAdmin):
+    list_display = ("day", "request_type", "product", "requests", "items", "revenue")
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related("product").prefetch_related("product__translations")
+
+
 admin.site.register(ConsultationRequest, ConsultationRequestAdmin)
 admin.site.register(CommercialOfferRequest, OfferRequestAdmin)
 admin.site.register(PriceRequest, PriceRequestAdmin)
 admin.site.register(Order, OrderAdmin)
 admin.site.register(SampleRequest, SampleRequestAdmin)
+admin.site.register(NotificationOutbox, NotificationOutboxAdmin)
+admin.site.register(DailyRequestStats, DailyRequestStatsAdmin)
+admin.site.register(DailyProductRequestStats, DailyProductRequestStatsAdmin)
@@ -45,3 +45,17 @@ class RequestsConfig(AppConfig):
             weak=False,
             dispatch_uid="SampleRequestModelFromClientRequestsApp",
         )
+
+        for model in (ConsultationRequest, CommercialOfferRequest, PriceRequest, SampleRequest):
+            post_save.connect(
+                request_save_handlers.update_stats_on_create,
+                sender=model,
+                weak=False,
+                dispatch_uid=f"{model.__name__}StatsFromClientRequestsApp",
+            )
+        request_save_handlers.order_ready.connect(
+            request_save_handlers.update_stats_on_create,
+            sender=Order,
+            weak=False,
+            dispatch_uid="OrderStatsFromClientRequestsApp",
+        )
@@ -0,0 +1,202 @@
+import csv
+import re
+import zipfile
+from datetime import datetime
+from xml.sax.saxutils import escape
+from django.conf import settings
+from django.db.models import F, OuterRef, Subquery
+from django.utils import timezone
+from apps.products.models import Product
+from common.utils import csv_safe
+from .models import PriceRequest, Order
+
+CHUNK_SIZE = 2000
+DATE_FORMAT = "%Y-%m-%d %H:%M"
+
+REQUEST_COLUMNS = (("id", "id"), ("date", "Дата"), ("name", "Контактное лицо"), ("number", "Номер телефона"))
+PRODUCT_COLUMNS = (("product_name", "Товар"), ("product_code", "Артикул"))
+ORDER_LINE_COLUMNS = (
+    ("id", "Заказ"),
+    *REQUEST_COLUMNS[1:],
+    *PRODUCT_COLUMNS,
+    ("products__count", "Количество"),
+    ("products__order_price", "Цена на момент заказа"),
+    ("line_total", "Сумма"),
+)
+
+
+def _product_name(product_ref):
+    ProductTranslation = Product._parler_meta.root_model
+    translations = ProductTranslation.objects.filter(
+        master_id=OuterRef(product_ref), language_code=settings.LANGUAGE_CODE
+    )
+    return Subquery(translations.values("name")[:1])
+
+
+def export_rows(qs):
+    """
+    (заголовки, строки) выгрузки заявок из queryset админки. Названия и артикулы товаров подтягиваются
+    в том же запросе. Заказ выгружается строкой на каждый товар, заказ без товаров - одной строкой.
+    """
+    Model = qs.model
+    if Model is Order:
+        columns = ORDER_LINE_COLUMNS
+        rows = Order.objects.order_by("id", "products__id").annotate(
+            product_name=_product_name("products__product_id"),
+            product_code=F("products__product__code"),
+            line_total=F("products__count") * F("products__order_price"),
+        )
+    else:
+        columns = REQUEST_COLUMNS
+        rows = Model.objects.order_by("id")
+        if Model is PriceRequest:
+            columns += PRODUCT_COLUMNS
+            rows = rows.annotate(product_name=_product_name("product_id"), product_code=F("product__code"))
+    rows = rows.values_list(*[field for field, _ in columns])
+
+    return [title for _, title in columns], (_localize(row) for row in _pages(qs, rows))
+
+
+def _pages(qs, rows):
+    """
+    Строки заявок страницами по CHUNK_SIZE заявок, следующая страница - по id после последней.
+    Каждая страница - отдельный короткий запрос: курсор не держится открытым, пока ответ медленно скачивается.
+    """
+    ids = qs.order_by("id").values_list("id", flat=True)
+    last_id = None
+    while True:
+        page = ids if last_id is None else ids.filter(id__gt=last_id)
+        page = list(page[:CHUNK_SIZE])
+        if not page:
+            return
+        yield from rows.filter(id__in=page)
+        last_id = page[-1]
+
+
+def _localize(row):
+    return [timezone.localtime(value).strftime(DATE_FORMAT) if isinstance(value, datetime) else value for value in row]
+
+
+class Echo:
+    """
+    Псевдо-буфер для csv.writer: возвращает строку вместо записи
+    """
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(header, rows):
+    writer = csv.writer(Echo())
+    # BOM, чтобы Excel открыл кириллицу в UTF-8
+    yield "\ufeff" + writer.writerow(header)
+    for row in rows:
+        yield writer.writerow([csv_safe(value) for value in row])
+
+
+# xlsx
+class _Sink:
+    """
+    Поток для zipfile без seek: накапливает записанные байты до следующего pop()
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+XLSX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    "</Types>"
+)
+XLSX_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    "</Relationships>"
+)
+XLSX_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{name}" sheetId="1" r:id="rId1"/></sheets>'
+    "</workbook>"
+)
+XLSX_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    "</Relationships>"
+)
+XLSX_SHEET_START = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+XLSX_SHEET_END = "</sheetData></worksheet>"
+ILLEGAL_XML_CHARS_RE = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+def _column_letter(index):
+    letters = ""
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def _xlsx_row(number, values):
+    cells = []
+    for index, value in enumerate(values):
+        if value is None:
+            continue
+        ref = f"{_column_letter(index)}{number}"
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            cells.append(f'<c r="{ref}"><v>{value}</v></c>')
+        else:
+            text = escape(ILLEGAL_XML_CHARS_RE.sub("", str(value)))
+            cells.append(f'<c r="{ref}" t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>')
+    return f'<row r="{number}">{"".join(cells)}</row>'
+
+
+def stream_xlsx(header, rows, sheet_name="Export"):
+    """
+    Минимальный xlsx (один лист, строки inline) без сторонних библиотек.
+    Zip пишется в _Sink без seek, накопленные байты отдаются после каждых CHUNK_SIZE строк.
+    """
+    sink = _Sink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("[Content_Types].xml", XLSX_CONTENT_TYPES)
+        archive.writestr("_rels/.rels", XLSX_ROOT_RELS)
+        archive.writestr("xl/workbook.xml", XLSX_WORKBOOK.format(name=escape(sheet_name)))
+        archive.writestr("xl/_rels/workbook.xml.rels", XLSX_WORKBOOK_RELS)
+        with archive.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as sheet:
+            sheet.write((XLSX_SHEET_START + _xlsx_row(1, header)).encode())
+            for number, row in enumerate(rows, 2):
+                sheet.write(_xlsx_row(number, row).encode())
+                if number % CHUNK_SIZE == 0:
+                    yield sink.pop()
+            sheet.write(XLSX_SHEET_END.encode())
+    yield sink.pop()
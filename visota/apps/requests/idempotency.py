@@ -0,0 +1,94 @@
+import hashlib
+import json
+import logging
+from functools import wraps
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import status
+from rest_framework.response import Response
+
+logger = logging.getLogger("visota.forms")
+
+HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+
+
+def _cache():
+    return caches[settings.REQUESTS_IDEMPOTENCY_CACHE]
+
+
+def _fingerprint(request):
+    # токен reCAPTCHA при повторе формы фронтенд получает заново, в сравнении данных он не участвует
+    data = request.data
+    if hasattr(data, "items"):
+        data = {field: value for field, value in data.items() if field != "grecaptcha"}
+    return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _forget(cache, key):
+    try:
+        cache.delete(key)
+    except Exception as e:
+        logger.error(f"Idempotency cache is unavailable: {repr(e)}")
+
+
+def idempotent(create):
+    """
+    Повтор запроса с тем же заголовком Idempotency-Key получает сохраненный ответ первого,
+    без обращения к базе, reCAPTCHA и почте. Сохраняются только успешные ответы, на REQUESTS_IDEMPOTENCY_TTL секунд.
+    Пока первый запрос обрабатывается, повтор получает 409; тот же ключ с другими данными - 422.
+    Если кэш недоступен, запрос обрабатывается как обычный, без защиты от повтора.
+    """
+
+    @wraps(create)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return create(self, request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return Response({"global": [f"Слишком длинный {HEADER}"]}, status=status.HTTP_400_BAD_REQUEST)
+
+        cache = _cache()
+        cache_key = f"requests:idempotency:{request.path}:{hashlib.sha256(key.encode()).hexdigest()}"
+        fingerprint = _fingerprint(request)
+
+        try:
+            stored = cache.get(cache_key)
+            locked = stored is None and cache.add(f"{cache_key}:lock", True, settings.REQUESTS_IDEMPOTENCY_LOCK_TIMEOUT)
+        except Exception as e:
+            logger.error(f"Idempotency cache is unavailable: {repr(e)}")
+            return create(self, request, *args, **kwargs)
+
+        if stored is None:
+            if not locked:
+                return Response(
+                    {"global": ["Заявка уже отправлена и обрабатывается"]}, status=status.HTTP_409_CONFLICT
+                )
+            try:
+                response = create(self, request, *args, **kwargs)
+            except Exception:
+                _forget(cache, f"{cache_key}:lock")
+                raise
+            try:
+                if status.is_success(response.status_code):
+                    cache.set(
+                        cache_key,
+                        {"fingerprint": fingerprint, "status": response.status_code, "data": response.data},
+                        settings.REQUESTS_IDEMPOTENCY_TTL,
+                    )
+                cache.delete(f"{cache_key}:lock")
+            except Exception as e:
+                # заявка уже сохранена, ответ отдаем и без записи в кэш
+                logger.error(f"Idempotency cache is unavailable: {repr(e)}")
+            return response
+
+        if stored["fingerprint"] != fingerprint:
+            return Response(
+                {"global": [f"{HEADER} уже использован для другой заявки"]},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            )
+        response = Response(stored["data"], status=stored["status"])
+        response["Idempotent-Replayed"] = "true"
+        return response
+
+    return wrapper
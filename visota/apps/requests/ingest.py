@@ -0,0 +1,235 @@
+import json
+import logging
+import os
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone as dt_timezone
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import caches
+from django.db import models, transaction
+from django.db.models.signals import post_save
+from .models import Order, ProductOrder
+from .stats import record_submissions
+from .signals import request_save_handlers
+
+
+logger = logging.getLogger("visota.forms")
+
+INGEST_SCHEDULED_CACHE_KEY = "requests:ingest-scheduled"
+
+
+def pending_dir():
+    return os.path.join(settings.REQUESTS_JOURNAL_DIR, "pending")
+
+
+def processing_dir():
+    return os.path.join(settings.REQUESTS_JOURNAL_DIR, "processing")
+
+
+def failed_dir():
+    return os.path.join(settings.REQUESTS_JOURNAL_DIR, "failed")
+
+
+def _journal_value(data):
+    """
+    validated_data в JSON: объекты моделей заменяются на <поле>_id
+    """
+    result = {}
+    for field, value in data.items():
+        if isinstance(value, models.Model):
+            result[f"{field}_id"] = value.pk
+        elif isinstance(value, list):
+            result[field] = [_journal_value(item) for item in value]
+        else:
+            result[field] = value
+    return result
+
+
+def journal_submission(Model, validated_data):
+    """
+    Запись проверенной заявки в журнал на диске: отдельный файл, записанный через fsync и os.replace.
+    В базу заявка попадает позже в celery пачкой вместе с другими.
+    """
+    os.makedirs(pending_dir(), exist_ok=True)
+    entry = {"model": Model._meta.label_lower, "data": _journal_value(validated_data)}
+    name = f"{time.time_ns()}-{uuid.uuid4().hex}.json"
+    tmp_path = os.path.join(settings.REQUESTS_JOURNAL_DIR, f"{name}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(entry, f, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, os.path.join(pending_dir(), name))
+    logger.info(f"Submission journaled: {name}")
+    transaction.on_commit(schedule_ingest)
+
+
+def schedule_ingest():
+    """
+    Задача celery запускается не чаще одного раза за REQUESTS_INGEST_DELAY секунд на все процессы (ключ в общем кэше).
+    Если общий кэш недоступен, задача ставится без этого ограничения.
+    """
+    try:
+        scheduled = caches["shared"].add(INGEST_SCHEDULED_CACHE_KEY, True, settings.REQUESTS_INGEST_DELAY)
+    except Exception as e:
+        logger.error(f"Ingest is scheduled without debounce, cache is unavailable: {repr(e)}")
+        scheduled = True
+    if scheduled:
+        from .tasks import ingest_submissions_task
+
+        ingest_submissions_task.apply_async(countdown=settings.REQUESTS_INGEST_DELAY)
+
+
+def _requeue_stale():
+    """
+    Файлы, взятые в обработку упавшим воркером, возвращаются в очередь
+    """
+    border = time.time() - settings.REQUESTS_INGEST_STALE_AFTER
+    for name in os.listdir(processing_dir()):
+        path = os.path.join(processing_dir(), name)
+        try:
+            if os.path.getmtime(path) < border:
+                os.replace(path, os.path.join(pending_dir(), name))
+        except FileNotFoundError:
+            pass
+
+
+def _claim(limit):
+    """
+    Перенос до limit файлов из pending в processing. Переименование атомарно,
+    поэтому один файл достается только одному воркеру.
+    """
+    claimed = []
+    for name in sorted(os.listdir(pending_dir())):
+        path = os.path.join(processing_dir(), name)
+        try:
+            os.replace(os.path.join(pending_dir(), name), path)
+        except FileNotFoundError:
+            continue
+        os.utime(path)
+        claimed.append(path)
+        if len(claimed) >= limit:
+            break
+    return claimed
+
+
+def _submitted_at(path):
+    """
+    Время отправки формы: имя файла журнала начинается с time.time_ns() момента записи
+    """
+    return datetime.fromtimestamp(int(os.path.basename(path).split("-")[0]) / 1e9, tz=dt_timezone.utc)
+
+
+def _save(Model, entries, dates):
+    if Model is Order:
+        orders = Order.objects.bulk_create(
+            [Order(**{field: value for field, value in entry.items() if field != "products"}) for entry in entries]
+        )
+        ProductOrder.objects.bulk_create(
+            [
+                ProductOrder(**product, order=order)
+                for order, entry in zip(orders, entries)
+                for product in entry["products"]
+            ]
+        )
+        instances = orders
+    else:
+        instances = Model.objects.bulk_create([Model(**entry) for entry in entries])
+    # date с auto_now_add при bulk_create получает время сохранения, поэтому выставляется отдельно
+    for instance, date in zip(instances, dates):
+        instance.date = date
+    Model.objects.bulk_update(instances, ["date"])
+    return instances
+
+
+def _save_entries(entries):
+    """
+    Сохранение [(файл, модель, данные)] в одной транзакции, возвращает [(файл, модель, объект)]
+    """
+    grouped = defaultdict(list)
+    for entry in entries:
+        grouped[entry[1]].append(entry)
+    saved = []
+    with transaction.atomic():
+        for Model, model_entries in grouped.items():
+            instances = _save(
+                Model, [data for _, _, data in model_entries], [_submitted_at(path) for path, _, _ in model_entries]
+            )
+            saved += [(path, Model, instance) for (path, _, _), instance in zip(model_entries, instances)]
+    return saved
+
+
+def _fail(path, error):
+    """
+    Заявка, которую не удалось сохранить, переносится в failed и больше не обрабатывается
+    """
+    os.makedirs(failed_dir(), exist_ok=True)
+    os.replace(path, os.path.join(failed_dir(), os.path.basename(path)))
+    logger.error(f"Submission {os.path.basename(path)} moved to failed: {error!r}")
+
+
+def _read(path):
+    with open(path, encoding="utf-8") as f:
+        entry = json.load(f)
+    return path, apps.get_model(entry["model"]), entry["data"]
+
+
+def _notify(Model, instances):
+    for instance in instances:
+        if Model is Order:
+            request_save_handlers.order_ready.send(Model, instance=instance, created=True, ingested=True)
+        else:
+            post_save.send(
+                Model, instance=instance, created=True, raw=False, using="default", update_fields=None, ingested=True
+            )
+    try:
+        record_submissions(Model, [instance.pk for instance in instances])
+    except Exception:
+        # заявки уже сохранены; статистику восстановит rebuild_request_stats
+        logger.exception(f"Stats for ingested {Model._meta.label_lower} are not updated")
+
+
+def ingest_submissions():
+    """
+    Сохранение заявок из журнала пачками по REQUESTS_INGEST_BATCH_SIZE через bulk_create.
+    Если пачка не сохраняется, заявки сохраняются по одной, а не сохранившиеся переносятся в failed.
+    Файлы удаляются после коммита, уведомления отправляются так же, как при обычном сохранении,
+    статистика обновляется одним вызовом record_submissions на пачку.
+    Доставка - не меньше одного раза: если воркер упадет между коммитом и удалением файлов, через
+    REQUESTS_INGEST_STALE_AFTER секунд файлы вернутся в очередь и заявки сохранятся повторно.
+    Возвращает количество сохраненных заявок.
+    """
+    os.makedirs(pending_dir(), exist_ok=True)
+    os.makedirs(processing_dir(), exist_ok=True)
+    _requeue_stale()
+
+    saved = 0
+    while paths := _claim(settings.REQUESTS_INGEST_BATCH_SIZE):
+        entries = []
+        for path in paths:
+            try:
+                entries.append(_read(path))
+            except (ValueError, LookupError) as e:
+                _fail(path, e)
+
+        try:
+            created = _save_entries(entries)
+        except Exception as e:
+            logger.warning(f"Ingest batch failed, saving submissions one by one: {e!r}")
+            created = []
+            for entry in entries:
+                try:
+                    created += _save_entries([entry])
+                except Exception as e:
+                    _fail(entry[0], e)
+
+        grouped = defaultdict(list)
+        for path, Model, instance in created:
+            os.remove(path)
+            grouped[Model].append(instance)
+        for Model, instances in grouped.items():
+            _notify(Model, instances)
+            saved += len(instances)
+        logger.info(f"Ingested submissions: {len(created)} of {len(paths)}")
+    return saved
@@ -0,0 +1,41 @@
+import time
+from itertools import cycle, islice
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from apps.products.models import Product
+from apps.requests.serializers import ProductOrderSerializer, OrderSerializer
+
+
+class Command(BaseCommand):
+    help = "Замер проверки строк заказа на существующих товарах, в базу ничего не пишется"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lines", type=int, default=500, help="Строк в заказе")
+        parser.add_argument("--repeat", type=int, default=20, help="Сколько раз повторить проверку")
+
+    def handle(self, *args, lines=500, repeat=20, **options):
+        products = list(
+            Product.objects.filter(current_price__gte=1).order_by("id").values_list("id", "current_price")[:lines]
+        )
+        if not products:
+            raise CommandError("В базе нет товаров с ценой")
+        order_lines = [
+            {"product": pk, "count": 1, "order_price": price} for pk, price in islice(cycle(products), lines)
+        ]
+
+        timings = []
+        with CaptureQueriesContext(connection) as queries:
+            for _ in range(repeat):
+                started = time.perf_counter()
+                validated = ProductOrderSerializer(many=True).run_validation(order_lines)
+                OrderSerializer().validate_products(validated)
+                timings.append(time.perf_counter() - started)
+
+        timings.sort()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Строк: {lines}, повторов: {repeat}, запросов на проверку: {len(queries) // repeat}, "
+                f"медиана: {timings[len(timings) // 2] * 1000:.1f} мс, максимум: {timings[-1] * 1000:.1f} мс"
+            )
+        )
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from apps.requests.stats import rebuild_request_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчет дневной статистики заявок по всем сохраненным заявкам, "
+        "например после удаления заявок в обход админки. "
+        "Запускать при остановленных воркерах Celery, иначе заявки, учтенные во время пересчета, посчитаются неверно"
+    )
+
+    def handle(self, *args, **options):
+        days, products = rebuild_request_stats()
+        self.stdout.write(self.style.SUCCESS(f"Строк по типам: {days}, строк по товарам: {products}"))
@@ -0,0 +1,48 @@
+# Generated by Django 5.0.3 on 2026-10-19 17:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("requests", "0007_commercialofferrequest_delete_offerrequest"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="NotificationOutbox",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "model_label",
+                    models.CharField(max_length=100, verbose_name="модель заявки"),
+                ),
+                ("object_id", models.PositiveBigIntegerField(verbose_name="id заявки")),
+                (
+                    "queued_at",
+                    models.DateTimeField(
+                        auto_now_add=True, verbose_name="поставлено в очередь"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "письмо о заявке в очереди",
+                "verbose_name_plural": "письма о заявках в очереди",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="notificationoutbox",
+            constraint=models.UniqueConstraint(
+                fields=("model_label", "object_id"), name="unique_notification_outbox"
+            ),
+        ),
+    ]
@@ -0,0 +1,137 @@
+# Generated by Django 5.0.3 on 2026-10-19 17:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0026_alter_subcategory_category"),
+        ("requests", "0008_notificationoutbox"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailyRequestStats",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField(verbose_name="день")),
+                (
+                    "request_type",
+                    models.CharField(
+                        choices=[
+                            ("consultationrequest", "консультация"),
+                            ("commercialofferrequest", "коммерческое предложение"),
+                            ("pricerequest", "запрос цены"),
+                            ("order", "заказ"),
+                            ("samplerequest", "образцы"),
+                        ],
+                        max_length=32,
+                        verbose_name="тип заявки",
+                    ),
+                ),
+                (
+                    "requests",
+                    models.PositiveIntegerField(default=0, verbose_name="заявок"),
+                ),
+                (
+                    "items",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="единиц товара"
+                    ),
+                ),
+                (
+                    "revenue",
+                    models.PositiveBigIntegerField(
+                        default=0, verbose_name="сумма заказов"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "заявки за день",
+                "verbose_name_plural": "заявки по дням",
+                "ordering": ("-day", "request_type"),
+            },
+        ),
+        migrations.CreateModel(
+            name="DailyProductRequestStats",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField(verbose_name="день")),
+                (
+                    "request_type",
+                    models.CharField(
+                        choices=[
+                            ("consultationrequest", "консультация"),
+                            ("commercialofferrequest", "коммерческое предложение"),
+                            ("pricerequest", "запрос цены"),
+                            ("order", "заказ"),
+                            ("samplerequest", "образцы"),
+                        ],
+                        max_length=32,
+                        verbose_name="тип заявки",
+                    ),
+                ),
+                (
+                    "requests",
+                    models.PositiveIntegerField(default=0, verbose_name="заявок"),
+                ),
+                (
+                    "items",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="единиц товара"
+                    ),
+                ),
+                (
+                    "revenue",
+                    models.PositiveBigIntegerField(
+                        default=0, verbose_name="сумма заказов"
+                    ),
+                ),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="products.product",
+                        verbose_name="товар",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "заявки по товару за день",
+                "verbose_name_plural": "заявки по товарам по дням",
+                "ordering": ("-day", "request_type", "product"),
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="dailyrequeststats",
+            constraint=models.UniqueConstraint(
+                fields=("day", "request_type"), name="unique_daily_request_stats"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="dailyproductrequeststats",
+            constraint=models.UniqueConstraint(
+                fields=("day", "request_type", "product"),
+                name="unique_daily_product_request_stats",
+            ),
+        ),
+    ]
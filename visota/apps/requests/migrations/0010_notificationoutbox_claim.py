@@ -0,0 +1,39 @@
+# Generated by Django 5.0.3 on 2026-10-19 17:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("requests", "0009_dailyrequeststats"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="notificationoutbox",
+            name="attempts",
+            field=models.PositiveSmallIntegerField(
+                default=0, verbose_name="неудачных попыток"
+            ),
+        ),
+        migrations.AddField(
+            model_name="notificationoutbox",
+            name="claim",
+            field=models.CharField(
+                blank=True, max_length=32, verbose_name="обработчик"
+            ),
+        ),
+        migrations.AddField(
+            model_name="notificationoutbox",
+            name="claimed_at",
+            field=models.DateTimeField(
+                blank=True, null=True, verbose_name="взято в отправку"
+            ),
+        ),
+        migrations.AddField(
+            model_name="notificationoutbox",
+            name="last_error",
+            field=models.TextField(blank=True, verbose_name="последняя ошибка"),
+        ),
+    ]
@@ -96,3 +96,86 @@ class SampleRequest(models.Model):
     class Meta:
         verbose_name = "запрос на образцы продукции"
         verbose_name_plural = "запросы на образцы продукции"
+
+
+class NotificationOutbox(models.Model):
+    """
+    Заявки, письма о которых еще не отправлены. Письма уходят пачкой через одно SMTP соединение.
+    Строки забирает один обработчик (claim), письма с attempts >= REQUESTS_MAIL_MAX_ATTEMPTS больше не отправляются.
+    """
+
+    model_label = models.CharField("модель заявки", max_length=100)
+    object_id = models.PositiveBigIntegerField("id заявки")
+    queued_at = models.DateTimeField("поставлено в очередь", auto_now_add=True)
+    claim = models.CharField("обработчик", max_length=32, blank=True)
+    claimed_at = models.DateTimeField("взято в отправку", null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField("неудачных попыток", default=0)
+    last_error = models.TextField("последняя ошибка", blank=True)
+
+    def __str__(self):
+        return f"{self.model_label} {self.object_id}"
+
+    class Meta:
+        verbose_name = "письмо о заявке в очереди"
+        verbose_name_plural = "письма о заявках в очереди"
+        constraints = [
+            models.UniqueConstraint(fields=("model_label", "object_id"), name="unique_notification_outbox"),
+        ]
+
+
+REQUEST_TYPE_CHOICES = {
+    "consultationrequest": "консультация",
+    "commercialofferrequest": "коммерческое предложение",
+    "pricerequest": "запрос цены",
+    "order": "заказ",
+    "samplerequest": "образцы",
+}
+
+
+class DailyRequestStats(models.Model):
+    """
+    Количество заявок за день по типу, для заказов - товары и выручка. Обновляется при сохранении заявок.
+    """
+
+    day = models.DateField("день")
+    request_type = models.CharField("тип заявки", max_length=32, choices=REQUEST_TYPE_CHOICES)
+    requests = models.PositiveIntegerField("заявок", default=0)
+    items = models.PositiveIntegerField("единиц товара", default=0)
+    revenue = models.PositiveBigIntegerField("сумма заказов", default=0)
+
+    def __str__(self):
+        return f"{self.day} {self.get_request_type_display()}"
+
+    class Meta:
+        verbose_name = "заявки за день"
+        verbose_name_plural = "заявки по дням"
+        ordering = ("-day", "request_type")
+        constraints = [
+            models.UniqueConstraint(fields=("day", "request_type"), name="unique_daily_request_stats"),
+        ]
+
+
+class DailyProductRequestStats(models.Model):
+    """
+    Заявки по товару за день: запросы цены и заказы, для заказов - количество и выручка
+    """
+
+    day = models.DateField("день")
+    request_type = models.CharField("тип заявки", max_length=32, choices=REQUEST_TYPE_CHOICES)
+    product = models.ForeignKey(Product, verbose_name="товар", on_delete=models.CASCADE, related_name="+")
+    requests = models.PositiveIntegerField("заявок", default=0)
+    items = models.PositiveIntegerField("единиц товара", default=0)
+    revenue = models.PositiveBigIntegerField("сумма заказов", default=0)
+
+    def __str__(self):
+        return f"{self.day} {self.get_request_type_display()} {self.product_id}"
+
+    class Meta:
+        verbose_name = "заявки по товару за день"
+        verbose_name_plural = "заявки по товарам по дням"
+        ordering = ("-day", "request_type", "product")
+        constraints = [
+            models.UniqueConstraint(
+                fields=("day", "request_type", "product"), name="unique_daily_product_request_stats"
+            ),
+        ]
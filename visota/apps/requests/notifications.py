@@ -0,0 +1,163 @@
+import logging
+import uuid
+from datetime import timedelta
+from smtplib import SMTPConnectError, SMTPException, SMTPServerDisconnected
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ObjectDoesNotExist
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import F, Q
+from django.template.loader import render_to_string
+from django.utils import timezone
+from .models import PriceRequest, Order, NotificationOutbox
+
+
+logger = logging.getLogger("visota.forms")
+
+NOTIFICATIONS_SCHEDULED_CACHE_KEY = "requests:notifications-scheduled"
+
+
+class NotificationsNotSent(Exception):
+    pass
+
+
+NOTIFICATION_RELATED = {
+    PriceRequest: {"select": ("product",), "prefetch": ("product__translations",)},
+    Order: {"select": (), "prefetch": ("products__product__translations",)},
+}
+
+
+def render_notification(Model, pk):
+    """
+    (тема, текст) письма о заявке по шаблонам requests/notifications/<модель>.txt,
+    связанные товары загружаются одной пачкой запросов
+    """
+    related = NOTIFICATION_RELATED.get(Model, {})
+    instance = (
+        Model.objects.select_related(*related.get("select", ()))
+        .prefetch_related(*related.get("prefetch", ()))
+        .get(pk=pk)
+    )
+    name = Model._meta.model_name
+    context = {"instance": instance}
+    subject = render_to_string(f"requests/notifications/{name}_subject.txt", context).strip()
+    message = render_to_string(f"requests/notifications/{name}.txt", context)
+    return subject, message
+
+
+def queue_notification(model_label, pk):
+    """
+    Письма о заявках за REQUESTS_MAIL_DELAY секунд собираются и отправляются одной пачкой.
+    Вызывается после коммита заявки (см. request_save_handlers.send_mail_on_create).
+    """
+    NotificationOutbox.objects.bulk_create(
+        [NotificationOutbox(model_label=model_label, object_id=pk)], ignore_conflicts=True
+    )
+    if caches["shared"].add(NOTIFICATIONS_SCHEDULED_CACHE_KEY, True, settings.REQUESTS_MAIL_DELAY):
+        from .tasks import send_queued_notifications_task
+
+        send_queued_notifications_task.apply_async(countdown=settings.REQUESTS_MAIL_DELAY)
+
+
+def notification_message(model_label, pk, connection):
+    subject, message = render_notification(apps.get_model(model_label), pk)
+    return EmailMessage(
+        subject,
+        message,
+        settings.REQUESTS_MAIL_FROM,
+        settings.REQUESTS_MAIL_TO,
+        connection=connection,
+    )
+
+
+def _claim(limit, after_id=0):
+    """
+    Забирает до limit писем с id больше after_id в отправку. UPDATE с тем же условием, что и выборка,
+    поэтому строку получает только один обработчик; строки упавшего обработчика освобождаются
+    через REQUESTS_MAIL_CLAIM_TIMEOUT секунд.
+    """
+    now = timezone.now()
+    token = uuid.uuid4().hex
+    available = Q(claimed_at__isnull=True) | Q(
+        claimed_at__lt=now - timedelta(seconds=settings.REQUESTS_MAIL_CLAIM_TIMEOUT)
+    )
+    outbox = NotificationOutbox.objects.filter(
+        available, id__gt=after_id, attempts__lt=settings.REQUESTS_MAIL_MAX_ATTEMPTS
+    )
+    ids = list(outbox.order_by("id").values_list("id", flat=True)[:limit])
+    outbox.filter(id__in=ids).update(claim=token, claimed_at=now)
+    return list(
+        NotificationOutbox.objects.filter(claim=token)
+        .order_by("id")
+        .values_list("id", "model_label", "object_id", "attempts")
+    )
+
+
+def _release(ids, error=None):
+    """
+    Возвращает строки в очередь; с error засчитывается неудачная попытка
+    """
+    rows = NotificationOutbox.objects.filter(id__in=ids)
+    if error is None:
+        rows.update(claim="", claimed_at=None)
+        return
+    rows.update(claim="", claimed_at=None, attempts=F("attempts") + 1, last_error=repr(error))
+
+
+def send_queued_notifications():
+    """
+    Отправка писем из очереди через одно SMTP соединение.
+    Отправленные строки удаляются после каждой пачки, в том числе при ошибке посреди нее.
+    Письмо, которое не удалось собрать или которое отклонил сервер, возвращается в очередь с увеличенным attempts
+    и не мешает отправке остальных; после REQUESTS_MAIL_MAX_ATTEMPTS попыток оно остается в таблице
+    с последней ошибкой и больше не отправляется. При обрыве соединения неотправленные строки возвращаются
+    в очередь, а ошибка пробрасывается для повтора задачи.
+    Возвращает количество отправленных писем, NotificationsNotSent если часть писем нужно отправить повторно.
+    """
+    if not NotificationOutbox.objects.exists():
+        return 0
+
+    sent = retry = 0
+    last_id = 0
+    with get_connection(fail_silently=False) as connection:
+        while rows := _claim(settings.REQUESTS_MAIL_BATCH_SIZE, last_id):
+            last_id = rows[-1][0]
+            done, errors = [], {}
+            try:
+                for row_id, model_label, pk, _ in rows:
+                    try:
+                        notification_message(model_label, pk, connection).send()
+                    except (LookupError, ObjectDoesNotExist) as e:
+                        logger.warning(f"Skipping notification for {model_label} {pk}: {repr(e)}")
+                    except (SMTPServerDisconnected, SMTPConnectError):
+                        raise
+                    except SMTPException as e:
+                        logger.error(f"Notification for {model_label} {pk} rejected: {repr(e)}")
+                        errors[row_id] = e
+                        continue
+                    except OSError:
+                        raise
+                    except Exception as e:
+                        logger.exception(f"Notification for {model_label} {pk} failed")
+                        errors[row_id] = e
+                        continue
+                    else:
+                        sent += 1
+                    done.append(row_id)
+            finally:
+                NotificationOutbox.objects.filter(id__in=done).delete()
+                for row_id, error in errors.items():
+                    _release([row_id], error)
+                _release([row[0] for row in rows if row[0] not in errors and row[0] not in done])
+            for row_id, _, _, attempts in rows:
+                if row_id not in errors:
+                    continue
+                if attempts + 1 < settings.REQUESTS_MAIL_MAX_ATTEMPTS:
+                    retry += 1
+                else:
+                    logger.error(f"Notification outbox row {row_id} failed {attempts + 1} times, giving up")
+    logger.info(f"Sent notifications: {sent}")
+    if retry:
+        raise NotificationsNotSent(f"{retry} notifications will be retried")
+    return sent
@@ -0,0 +1,128 @@
+import hashlib
+import logging
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from django.core.cache import caches
+
+
+logger = logging.getLogger("visota.forms")
+
+
+class RecaptchaUnavailable(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """
+    После RECAPTCHA_BREAKER_THRESHOLD ошибок подряд запросы к Google не отправляются
+    RECAPTCHA_BREAKER_RESET секунд, затем пропускается одна пробная проверка.
+    Состояние хранится в памяти процесса.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._probing or time.monotonic() - self._opened_at < settings.RECAPTCHA_BREAKER_RESET:
+                return False
+            self._probing = True
+            return True
+
+    def success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= settings.RECAPTCHA_BREAKER_THRESHOLD:
+                if self._opened_at is None or self._probing:
+                    logger.error(f"Grecaptcha circuit opened after {self._failures} failures")
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+
+class RecaptchaClient:
+    """
+    Проверка токенов reCAPTCHA через одну сессию с пулом соединений и строгими таймаутами.
+    Успешные ответы кэшируются в общем кэше на RECAPTCHA_TOKEN_CACHE_TTL секунд по токену и заявке (форма и телефон):
+    повторная отправка той же заявки в любой процесс не идет в Google, который второй раз ответил бы
+    timeout-or-duplicate, а с другой заявкой тот же токен проверяется заново.
+    """
+
+    def __init__(self):
+        self.breaker = CircuitBreaker()
+        self._session = None
+        self._session_lock = threading.Lock()
+
+    @property
+    def session(self):
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_maxsize=settings.RECAPTCHA_POOL_SIZE, max_retries=0)
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    self._session = session
+        return self._session
+
+    @staticmethod
+    def cache_key(token, submission=""):
+        return "recaptcha:" + hashlib.sha256(f"{submission}\n{token}".encode()).hexdigest()
+
+    def verify(self, token, submission=""):
+        """
+        Ответ siteverify для токена, RecaptchaUnavailable если Google недоступен или цепь разомкнута.
+        submission - строка, определяющая заявку, для которой действует сохраненный успешный ответ.
+        """
+        cache = caches[settings.RECAPTCHA_TOKEN_CACHE]
+        key = self.cache_key(token, submission)
+        try:
+            result = cache.get(key)
+        except Exception as e:
+            logger.error(f"Grecaptcha cache is unavailable: {repr(e)}")
+            result = None
+        if result is not None:
+            logger.info("Grecaptcha verification result taken from cache")
+            return result
+
+        if not settings.RECAPTCHA_SECRET_KEY:
+            raise RecaptchaUnavailable("RECAPTCHA_SECRET_KEY is not set")
+        if not self.breaker.allow():
+            raise RecaptchaUnavailable("circuit is open")
+
+        try:
+            res = self.session.post(
+                settings.RECAPTCHA_VERIFY_URL,
+                data={"secret": settings.RECAPTCHA_SECRET_KEY, "response": token},
+                timeout=(settings.RECAPTCHA_CONNECT_TIMEOUT, settings.RECAPTCHA_READ_TIMEOUT),
+            )
+            res.raise_for_status()
+            result = res.json()
+        except (requests.RequestException, ValueError) as e:
+            self.breaker.failure()
+            raise RecaptchaUnavailable(repr(e)) from e
+
+        self.breaker.success()
+        logger.info(f"Grecaptcha verification; status: {res.status_code}; data: {result}")
+        if result.get("success"):
+            try:
+                cache.set(key, result, settings.RECAPTCHA_TOKEN_CACHE_TTL)
+            except Exception as e:
+                logger.error(f"Grecaptcha cache is unavailable: {repr(e)}")
+        return result
+
+
+recaptcha_client = RecaptchaClient()
@@ -1,8 +1,8 @@
 import re
-import requests
 import logging
 from rest_framework import serializers
 from .signals import request_save_handlers
+from .recaptcha import recaptcha_client, RecaptchaUnavailable
 from django.conf import settings
 
 from .models import *
@@ -43,10 +43,10 @@ class CommonSerializer(serializers.ModelSerializer):
             raise e
         logger.info("Ends validation")
 
-        self.validate_grecaptcha(data.get("grecaptcha"))
+        self.validate_grecaptcha(data.get("grecaptcha"), data.get("number"))
         return result
 
-    def validate_grecaptcha(self, token):
+    def validate_grecaptcha(self, token, number=None):
         logger.info("Starts grecaptcha validation.")
 
         if token is None:
@@ -55,27 +55,23 @@ class CommonSerializer(serializers.ModelSerializer):
                 {"global": ["Формы временно недоступны, попробуйте связаться с нами другим способом"]}
             )
 
-        data = {"secret": settings.RECAPTCHA_SECRET_KEY, "response": token}
         try:
-            logger.info(f"Starts request for grecaptcha verification")
-
-            res = requests.post("https://www.google.com/recaptcha/api/siteverify", params=data)
-            data = res.json()
-
-            logger.info(f"Ends request for grecaptcha verification; status: {res.status_code}; data: {data}")
-        except Exception as e:
-            logger.error(f"Fails request for grecaptcha verification. {repr(e)}")
-            # raise serializers.ValidationError(
-            #     {"global": ["Формы временно не работают, попробуйте связаться с нами другим способом"]}
-            # )
-            return
+            # сохраненный ответ Google действует только для повтора той же заявки
+            data = recaptcha_client.verify(token, f"{self.Meta.model._meta.label_lower}:{number or ''}")
+        except RecaptchaUnavailable as e:
+            logger.error(f"Fails request for grecaptcha verification. {e}")
+            if settings.RECAPTCHA_FAIL_OPEN:
+                return
+            raise serializers.ValidationError(
+                {"global": ["Формы временно не работают, попробуйте связаться с нами другим способом"]}
+            )
 
         # if res.status_code != 200:
         #     raise serializers.ValidationError({"global": ["Что-то пошло не так, попробуйте еще раз"]})
 
         if not data["success"] and (
             "invalid-input-response"
-            in data["error-codes"]
+            in data.get("error-codes", [])
             # or "timeout-or-duplicate" in data["error-codes"]
         ):
             logger.warning("Grecaptcha validation faild.")
@@ -83,7 +79,8 @@ class CommonSerializer(serializers.ModelSerializer):
                 {"global": ["Формы временно недоступны, попробуйте связаться с нами другим способом"]}
             )
 
-        if data["success"] and data["score"] <= 0.5:
+        # у ответа может не быть score (например, для ключа v2), такой ответ не проходит проверку
+        if data["success"] and data.get("score", 0) <= 0.5:
             logger.warning("Grecaptcha validation faild.")
             raise serializers.ValidationError(
                 {"global": ["Формы временно недоступны, попробуйте связаться с нами другим способом"]}
@@ -112,6 +109,8 @@ class PriceRequestSerializer(CommonSerializer):
 
 class ProductOrderSerializer(serializers.ModelSerializer):
     # order_price = serializers.SerializerMethodField('get_current_price')
+    # товары всех строк загружаются одним запросом в OrderSerializer.validate_products
+    product = serializers.IntegerField(source="product_id", min_value=1)
 
     class Meta:
         model = ProductOrder
@@ -144,15 +143,18 @@ class OrderSerializer(CommonSerializer):
     #     return method
 
     def validate_products(self, products):
-        products_dict = {}
+        prices = Product.objects.only("id", "current_price").in_bulk({p["product_id"] for p in products})
         for p in products:
-            products_dict[p["product"].id] = p["order_price"]
-        queryset = Product.objects.filter(pk__in=map(lambda product: product["product"].id, products))
-        for p in queryset.iterator():
-            logger.info(
-                f"Validating product price. current price: {p.current_price}, order price: {products_dict[p.id]}"
-            )
-            if p.current_price != products_dict[p.id]:
+            product = prices.get(p["product_id"])
+            if product is None:
+                logger.warning(f"Ordered product does not exist: {p['product_id']}")
+                raise serializers.ValidationError(
+                    "Один или несколько товаров больше не продаются. Перезагрузите страницу."
+                )
+            if product.current_price != p["order_price"]:
+                logger.info(
+                    f"Validating product price. current price: {product.current_price}, order price: {p['order_price']}"
+                )
                 raise serializers.ValidationError(
                     "Цена на один или несколько продуктов изменилась. Перезагрузите страницу."
                 )
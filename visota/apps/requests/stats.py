@@ -0,0 +1,140 @@
+from collections import defaultdict
+from itertools import islice
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from .models import (
+    ConsultationRequest,
+    CommercialOfferRequest,
+    PriceRequest,
+    Order,
+    ProductOrder,
+    SampleRequest,
+    DailyRequestStats,
+    DailyProductRequestStats,
+)
+
+STATS_MODELS = (ConsultationRequest, CommercialOfferRequest, PriceRequest, Order, SampleRequest)
+CHUNK_SIZE = 2000
+
+
+def _deltas():
+    return defaultdict(lambda: [0, 0, 0])
+
+
+def collect_deltas(Model, ids, type_deltas, product_deltas):
+    """
+    Добавляет в type_deltas[(день, тип)] и product_deltas[(день, тип, товар)] прирост [заявок, единиц, выручки]
+    от заявок Model с данными id
+    """
+    request_type = Model._meta.model_name
+    fields = ("id", "date", "product_id") if Model is PriceRequest else ("id", "date")
+    days = {}
+    for pk, date, *product in Model.objects.filter(id__in=ids).values_list(*fields):
+        day = timezone.localdate(date)
+        days[pk] = day
+        type_deltas[(day, request_type)][0] += 1
+        if product and product[0] is not None:
+            product_deltas[(day, request_type, product[0])][0] += 1
+
+    if Model is Order:
+        ordered = set()
+        for order_id, product_id, count, order_price in ProductOrder.objects.filter(order_id__in=days).values_list(
+            "order_id", "product_id", "count", "order_price"
+        ):
+            day = days[order_id]
+            type_deltas[(day, request_type)][1] += count
+            type_deltas[(day, request_type)][2] += count * order_price
+            if product_id is None:
+                continue
+            delta = product_deltas[(day, request_type, product_id)]
+            if (order_id, product_id) not in ordered:
+                ordered.add((order_id, product_id))
+                delta[0] += 1
+            delta[1] += count
+            delta[2] += count * order_price
+
+
+def _increment(StatsModel, key_fields, key, delta):
+    lookup = dict(zip(key_fields, key))
+    requests, items, revenue = delta
+    increment = {"requests": F("requests") + requests, "items": F("items") + items, "revenue": F("revenue") + revenue}
+    if StatsModel.objects.filter(**lookup).update(**increment):
+        return
+    try:
+        with transaction.atomic():
+            StatsModel.objects.create(**lookup, requests=requests, items=items, revenue=revenue)
+    except IntegrityError:
+        # строку за этот день успел создать параллельный воркер
+        StatsModel.objects.filter(**lookup).update(**increment)
+
+
+def _decrement(StatsModel, key_fields, key, delta):
+    lookup = dict(zip(key_fields, key))
+    # не ниже нуля: строка могла быть пересчитана rebuild_request_stats уже без этих заявок
+    StatsModel.objects.filter(**lookup).update(
+        **{field: Greatest(F(field) - value, 0) for field, value in zip(("requests", "items", "revenue"), delta)}
+    )
+
+
+def submission_deltas(Model, ids):
+    """
+    (type_deltas, product_deltas) заявок Model с данными id, заявки читаются пачками по CHUNK_SIZE
+    """
+    type_deltas, product_deltas = _deltas(), _deltas()
+    ids = list(ids)
+    for start in range(0, len(ids), CHUNK_SIZE):
+        collect_deltas(Model, ids[start : start + CHUNK_SIZE], type_deltas, product_deltas)
+    return type_deltas, product_deltas
+
+
+def apply_deltas(type_deltas, product_deltas, subtract=False):
+    change = _decrement if subtract else _increment
+    with transaction.atomic():
+        for key, delta in type_deltas.items():
+            change(DailyRequestStats, ("day", "request_type"), key, delta)
+        for key, delta in product_deltas.items():
+            change(DailyProductRequestStats, ("day", "request_type", "product_id"), key, delta)
+
+
+def record_submissions(Model, ids):
+    """
+    Инкрементальное обновление дневной статистики новыми заявками, одна операция на (день, тип[, товар]).
+    Повторный вызов с теми же id учитывает заявки еще раз.
+    """
+    apply_deltas(*submission_deltas(Model, ids))
+
+
+def rebuild_request_stats():
+    """
+    Полный пересчет статистики по всем заявкам, заявки читаются пачками по CHUNK_SIZE.
+    Запускать при остановленных воркерах Celery: заявки, учтенные задачей во время пересчета,
+    окажутся посчитаны дважды или не посчитаны вовсе.
+    """
+    type_deltas, product_deltas = _deltas(), _deltas()
+    for Model in STATS_MODELS:
+        ids = Model.objects.order_by("id").values_list("id", flat=True).iterator(chunk_size=CHUNK_SIZE)
+        while chunk := list(islice(ids, CHUNK_SIZE)):
+            collect_deltas(Model, chunk, type_deltas, product_deltas)
+
+    with transaction.atomic():
+        DailyRequestStats.objects.all().delete()
+        DailyProductRequestStats.objects.all().delete()
+        DailyRequestStats.objects.bulk_create(
+            [
+                DailyRequestStats(day=day, request_type=request_type, requests=r, items=i, revenue=rev)
+                for (day, request_type), (r, i, rev) in type_deltas.items()
+            ],
+            batch_size=CHUNK_SIZE,
+        )
+        DailyProductRequestStats.objects.bulk_create(
+            [
+                DailyProductRequestStats(
+                    day=day, request_type=request_type, product_id=product_id, requests=r, items=i, revenue=rev
+                )
+                for (day, request_type, product_id), (r, i, rev) in product_deltas.items()
+            ],
+            batch_size=CHUNK_SIZE,
+        )
+    return len(type_deltas), len(product_deltas)
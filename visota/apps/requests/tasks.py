@@ -1,12 +1,46 @@
 from smtplib import SMTPException
+from django.apps import apps
+from django.conf import settings
 from django.core.mail import send_mail
 
 from visota.celery import app
+from .notifications import queue_notification, send_queued_notifications, NotificationsNotSent
+from .stats import record_submissions
+
+
+def retry_countdown(retries):
+    return min(settings.REQUESTS_MAIL_RETRY_DELAY * 2**retries, settings.REQUESTS_MAIL_RETRY_MAX_DELAY)
 
 
 @app.task(bind=True)
 def pass_request_to_email(self, subject, message):
     try:
-        send_mail(subject, message, "d_mal@mail.ru", ["d_mal@mail.ru"], fail_silently=False)
+        send_mail(subject, message, settings.REQUESTS_MAIL_FROM, settings.REQUESTS_MAIL_TO, fail_silently=False)
     except SMTPException as e:
-        raise self.retry(exc=e, countdown=2 * 60)
+        raise self.retry(exc=e, countdown=retry_countdown(self.request.retries))
+
+
+@app.task
+def send_request_notification(model_label, pk):
+    # письма ставятся в очередь сразу после коммита заявки, задача оставлена для уже поставленных сообщений
+    queue_notification(model_label, pk)
+
+
+@app.task(bind=True, max_retries=settings.REQUESTS_MAIL_MAX_RETRIES)
+def send_queued_notifications_task(self):
+    try:
+        return send_queued_notifications()
+    except (SMTPException, OSError, NotificationsNotSent) as e:
+        raise self.retry(exc=e, countdown=retry_countdown(self.request.retries))
+
+
+@app.task
+def update_request_stats_task(model_label, ids):
+    record_submissions(apps.get_model(model_label), ids)
+
+
+@app.task
+def ingest_submissions_task():
+    from .ingest import ingest_submissions
+
+    return ingest_submissions()
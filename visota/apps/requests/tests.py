@@ -1,3 +1,147 @@
-from django.test import TestCase
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+from rest_framework import serializers
+from .recaptcha import RecaptchaClient, RecaptchaUnavailable
+from .serializers import ConsultationRequestSerializer
 
-# Create your tests here.
+
+class FakeVerifyServer(ThreadingHTTPServer):
+    """
+    Локальный siteverify: отвечает status и body с задержкой delay, считает запросы
+    """
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), FakeVerifyHandler)
+        self.reset()
+
+    def reset(self):
+        self.status = 200
+        self.body = {"success": True, "score": 0.9}
+        self.delay = 0
+        self.requests = []
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_port}/recaptcha/api/siteverify"
+
+
+class FakeVerifyHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        self.server.requests.append(self.rfile.read(int(self.headers["Content-Length"])).decode())
+        time.sleep(self.server.delay)
+        body = json.dumps(self.server.body).encode()
+        try:
+            self.send_response(self.server.status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # клиент уже закрыл соединение по таймауту
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+class RecaptchaClientTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = FakeVerifyServer()
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.server.reset()
+        caches["shared"].clear()
+        settings_override = override_settings(
+            RECAPTCHA_VERIFY_URL=self.server.url,
+            RECAPTCHA_SECRET_KEY="secret",
+            RECAPTCHA_CONNECT_TIMEOUT=1,
+            RECAPTCHA_READ_TIMEOUT=0.2,
+            RECAPTCHA_BREAKER_THRESHOLD=2,
+            RECAPTCHA_BREAKER_RESET=60,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.recaptcha = RecaptchaClient()
+
+    def validate(self, token="token", number="+79990001122"):
+        with mock.patch("apps.requests.serializers.recaptcha_client", self.recaptcha):
+            ConsultationRequestSerializer().validate_grecaptcha(token, number)
+
+    def test_verifies_token_once(self):
+        self.assertEqual(self.recaptcha.verify("token"), {"success": True, "score": 0.9})
+        self.assertEqual(self.recaptcha.verify("token"), {"success": True, "score": 0.9})
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertIn("secret=secret", self.server.requests[0])
+
+    def test_cached_result_shared_between_clients(self):
+        self.validate()
+        self.recaptcha = RecaptchaClient()
+        self.validate()
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_cached_result_only_for_same_submission(self):
+        self.validate()
+        self.validate(number="+79990003344")
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_timeout(self):
+        self.server.delay = 0.5
+        started_at = time.monotonic()
+        with self.assertRaises(RecaptchaUnavailable):
+            self.recaptcha.verify("token")
+        self.assertLess(time.monotonic() - started_at, 0.5)
+
+    def test_breaker_opens_after_threshold(self):
+        self.server.status = 500
+        for _ in range(2):
+            with self.assertRaises(RecaptchaUnavailable):
+                self.recaptcha.verify("token")
+        with self.assertRaisesMessage(RecaptchaUnavailable, "circuit is open"):
+            self.recaptcha.verify("token")
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_breaker_probes_after_reset(self):
+        self.server.status = 500
+        for _ in range(2):
+            with self.assertRaises(RecaptchaUnavailable):
+                self.recaptcha.verify("token")
+        self.server.status = 200
+        with override_settings(RECAPTCHA_BREAKER_RESET=0):
+            self.assertTrue(self.recaptcha.verify("token")["success"])
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertTrue(self.recaptcha.breaker.allow())
+
+    @override_settings(RECAPTCHA_FAIL_OPEN=True)
+    def test_fail_open(self):
+        self.server.status = 503
+        self.validate()
+
+    @override_settings(RECAPTCHA_FAIL_OPEN=False)
+    def test_fail_closed(self):
+        self.server.status = 503
+        with self.assertRaises(serializers.ValidationError):
+            self.validate()
+
+    def test_low_score_rejected(self):
+        self.server.body = {"success": True, "score": 0.3}
+        with self.assertRaises(serializers.ValidationError):
+            self.validate()
+
+    def test_success_without_score_rejected(self):
+        self.server.body = {"success": True}
+        with self.assertRaises(serializers.ValidationError):
+            self.validate()
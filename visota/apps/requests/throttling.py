@@ -0,0 +1,171 @@
+import logging
+import re
+import threading
+import time
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import BaseThrottle
+
+logger = logging.getLogger("visota.forms")
+
+COUNTER_KEY = "requests:throttle:{scope}:{result}"
+
+
+class TokenBucket:
+    """
+    Ведра токенов в памяти процесса: capacity запросов подряд, затем по одному каждые 1 / rate секунд.
+    Полные ведра вычищаются, когда ключей становится больше max_keys.
+    """
+
+    def __init__(self, capacity, rate, max_keys=10000):
+        self.capacity = capacity
+        self.rate = rate
+        self.max_keys = max_keys
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _level(self, bucket, now):
+        tokens, updated_at = bucket
+        return min(self.capacity, tokens + (now - updated_at) * self.rate)
+
+    def take(self, key):
+        """
+        (разрешено ли, через сколько секунд появится токен)
+        """
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            tokens = self.capacity if bucket is None else self._level(bucket, now)
+            if tokens < 1:
+                self._buckets[key] = (tokens, now)
+                return False, (1 - tokens) / self.rate
+            self._buckets[key] = (tokens - 1, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets = {
+                    key: bucket for key, bucket in self._buckets.items() if self._level(bucket, now) < self.capacity
+                }
+            return True, 0
+
+
+class Counters:
+    """
+    Счетчики копятся в памяти процесса и раз в REQUESTS_THROTTLE_COUNTERS_FLUSH секунд
+    переносятся в общий кэш. Если кэш недоступен, накопленное остается до следующей попытки.
+    """
+
+    def __init__(self):
+        self._pending = {}
+        self._flushed_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def count(self, scope, result):
+        now = time.monotonic()
+        with self._lock:
+            self._pending[scope, result] = self._pending.get((scope, result), 0) + 1
+            if now - self._flushed_at < settings.REQUESTS_THROTTLE_COUNTERS_FLUSH:
+                return
+        self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._flushed_at = time.monotonic()
+        if not pending:
+            return
+        cache = caches[settings.REQUESTS_THROTTLE_COUNTERS_CACHE]
+        try:
+            for (scope, result), value in list(pending.items()):
+                key = COUNTER_KEY.format(scope=scope, result=result)
+                try:
+                    cache.incr(key, value)
+                except ValueError:
+                    cache.add(key, 0, None)
+                    cache.incr(key, value)
+                del pending[scope, result]
+        except Exception as e:
+            logger.error(f"Throttle counters are not flushed: {repr(e)}")
+            with self._lock:
+                for counter, value in pending.items():
+                    self._pending[counter] = self._pending.get(counter, 0) + value
+
+
+_counters = Counters()
+
+
+def count(scope, result):
+    _counters.count(scope, result)
+
+
+def throttle_counters():
+    _counters.flush()
+    cache = caches[settings.REQUESTS_THROTTLE_COUNTERS_CACHE]
+    keys = {
+        (scope, result): COUNTER_KEY.format(scope=scope, result=result)
+        for scope in settings.REQUESTS_THROTTLE_RATES
+        for result in ("allowed", "rejected")
+    }
+    values = cache.get_many(keys.values())
+    counters = {}
+    for (scope, result), key in keys.items():
+        counters.setdefault(scope, {})[result] = values.get(key, 0)
+    return counters
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Отсекает заявки до проверки данных и reCAPTCHA. Параметры ведра - REQUESTS_THROTTLE_RATES[scope]:
+    (запросов подряд, токенов в секунду). Счетчики пропущенных и отклоненных запросов - throttle_counters().
+    """
+
+    scope = None
+    _buckets = {}
+    _buckets_lock = threading.Lock()
+
+    def get_key(self, request, view):
+        raise NotImplementedError
+
+    @classmethod
+    def bucket(cls):
+        capacity, rate = settings.REQUESTS_THROTTLE_RATES[cls.scope]
+        with cls._buckets_lock:
+            bucket = cls._buckets.get(cls.scope)
+            if bucket is None or (bucket.capacity, bucket.rate) != (capacity, rate):
+                bucket = cls._buckets[cls.scope] = TokenBucket(capacity, rate)
+        return bucket
+
+    def allow_request(self, request, view):
+        self._wait = None
+        if request.method != "POST":
+            return True
+        key = self.get_key(request, view)
+        if key is None:
+            return True
+
+        allowed, wait = self.bucket().take(key)
+        count(self.scope, "allowed" if allowed else "rejected")
+        if not allowed:
+            self._wait = wait
+        return allowed
+
+    def wait(self):
+        return self._wait
+
+
+class FormIPThrottle(TokenBucketThrottle):
+    scope = "ip"
+
+    def get_key(self, request, view):
+        # адрес клиента берется из X-Forwarded-For с учетом REST_FRAMEWORK["NUM_PROXIES"]
+        return self.get_ident(request)
+
+
+class FormPhoneThrottle(TokenBucketThrottle):
+    scope = "phone"
+
+    def get_key(self, request, view):
+        number = request.data.get("number") if hasattr(request.data, "get") else None
+        if not isinstance(number, str):
+            return None
+        digits = re.sub(r"\D", "", number)
+        # у каждой формы свое ведро: заказ после запроса консультации с того же номера не отсекается
+        return f"{type(view).__name__}:{digits}" if digits else None
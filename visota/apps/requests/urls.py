@@ -13,4 +13,5 @@ router.register('offer', OfferRequestApi)
 
 urlpatterns = [
     path('', include(router.urls)),
+    path('throttle/', ThrottleCountersApi.as_view()),
 ]
\ No newline at end of file
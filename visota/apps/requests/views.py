@@ -1,21 +1,40 @@
 import logging
-from rest_framework import viewsets, mixins
+from django.conf import settings
+from rest_framework import viewsets, mixins, status
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
 from .models import *
 from .serializers import *
+from .ingest import journal_submission
+from .idempotency import idempotent
+from .throttling import FormIPThrottle, FormPhoneThrottle, throttle_counters
 
 
 logger = logging.getLogger("visota.forms")
 
 
 class CommonRequestApi(viewsets.GenericViewSet, mixins.CreateModelMixin):
+    throttle_classes = (FormIPThrottle, FormPhoneThrottle)
+
+    @idempotent
     def create(self, request, *args, **kwargs):
         logger.info(f"{request.path} starts form handling")
-        logger.info(f"Initial data: {request.data}")
-        response = super().create(request, *args, **kwargs)
+        logger.info("Initial data", extra={"payload": request.data})
+        if settings.REQUESTS_ASYNC_INGEST:
+            response = self.ingest(request)
+        else:
+            response = super().create(request, *args, **kwargs)
         logger.info(f"{request.path} ends form handling")
         return response
 
+    def ingest(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        journal_submission(self.get_queryset().model, serializer.validated_data)
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+
 
 class ConsultationRequestApi(CommonRequestApi):
     queryset = ConsultationRequest.objects.all()
@@ -40,3 +59,10 @@ class OrderApi(CommonRequestApi):
 class SampleRequestApi(CommonRequestApi):
     queryset = SampleRequest.objects.all()
     serializer_class = SampleRequestSerializer
+
+
+class ThrottleCountersApi(APIView):
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        return Response(throttle_counters())
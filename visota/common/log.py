@@ -0,0 +1,162 @@
+import contextvars
+import copy
+import json
+import logging
+import os
+import queue
+import re
+import uuid
+from logging.handlers import QueueHandler, QueueListener
+
+REQUEST_ID_HEADER = "X-Request-ID"
+REQUEST_ID_RE = re.compile(r"^[\w.-]{1,64}$")
+
+# поля заявок, которые не пишутся в лог как есть
+REDACTED_FIELDS = {"grecaptcha"}
+MASKED_FIELDS = {"name", "number"}
+MAX_MESSAGE_LENGTH = 2000
+MAX_VALUE_LENGTH = 200
+
+correlation_id = contextvars.ContextVar("correlation_id", default=None)
+_exception_formatter = logging.Formatter()
+
+
+class CorrelationIdMiddleware:
+    """
+    id запроса из заголовка X-Request-ID (или новый), попадает во все записи лога запроса и в ответ
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request_id = request.headers.get(REQUEST_ID_HEADER, "")
+        if not REQUEST_ID_RE.match(request_id):
+            request_id = uuid.uuid4().hex
+        token = correlation_id.set(request_id)
+        try:
+            response = self.get_response(request)
+        finally:
+            correlation_id.reset(token)
+        response[REQUEST_ID_HEADER] = request_id
+        return response
+
+
+class CorrelationIdFilter(logging.Filter):
+    """
+    Выполняется в потоке запроса, поэтому id берется из контекста до передачи записи в очередь
+    """
+
+    def filter(self, record):
+        record.correlation_id = correlation_id.get()
+        return True
+
+
+def _mask(value):
+    value = str(value)
+    if len(value) <= 2:
+        return "*" * len(value)
+    return "*" * (len(value) - 2) + value[-2:]
+
+
+def redact(data):
+    """
+    Данные формы для лога: токены вырезаются, персональные данные маскируются, длинные значения обрезаются
+    """
+    if isinstance(data, dict) or hasattr(data, "items"):
+        result = {}
+        for field, value in data.items():
+            if field in REDACTED_FIELDS:
+                result[field] = "[redacted]"
+            elif field in MASKED_FIELDS and isinstance(value, (str, int)):
+                result[field] = _mask(value)
+            else:
+                result[field] = redact(value)
+        return result
+    if isinstance(data, (list, tuple)):
+        return [redact(item) for item in data]
+    if isinstance(data, str) and len(data) > MAX_VALUE_LENGTH:
+        return data[:MAX_VALUE_LENGTH] + "..."
+    return data
+
+
+class JSONFormatter(logging.Formatter):
+    """
+    Запись лога одной строкой JSON. Поле payload (extra={"payload": ...}) проходит через redact().
+    """
+
+    def format(self, record):
+        message = record.getMessage()
+        if len(message) > MAX_MESSAGE_LENGTH:
+            message = message[:MAX_MESSAGE_LENGTH] + "..."
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": message,
+            "correlation_id": getattr(record, "correlation_id", None),
+            "process": record.process,
+            "thread": record.thread,
+        }
+        if hasattr(record, "payload"):
+            entry["payload"] = redact(record.payload)
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _RecordQueueHandler(QueueHandler):
+    def prepare(self, record):
+        """
+        Копия записи без объектов, которые нельзя безопасно читать из другого потока:
+        аргументы подставляются в сообщение, traceback и данные запроса фиксируются сейчас
+        """
+        record = copy.copy(record)
+        record.msg = record.message = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _exception_formatter.formatException(record.exc_info)
+        record.exc_info = None
+        if hasattr(record, "payload"):
+            record.payload = redact(record.payload)
+        return record
+
+
+class QueueListenerHandler(logging.Handler):
+    """
+    Поток запроса только кладет запись в очередь (QueueHandler), форматирование и запись в файл идут
+    в отдельном потоке QueueListener. handlers - ссылки вида cfg://handlers.<имя> в LOGGING.
+    Поток слушателя запускается при настройке логирования и заново в каждом дочернем процессе
+    после fork (prefork Celery, gunicorn --preload): потоки родителя в дочерний процесс не переходят.
+    """
+
+    def __init__(self, handlers, respect_handler_level=True):
+        super().__init__()
+        # элементы ConvertingList из dictConfig превращаются в обработчики при обращении по индексу
+        self._handlers = [handlers[i] for i in range(len(handlers))]
+        self.respect_handler_level = respect_handler_level
+        self._start()
+        os.register_at_fork(after_in_child=self._restart)
+
+    def _start(self):
+        # очередь тоже новая: записи, не записанные родителем до fork, он запишет сам
+        self.queue = queue.SimpleQueue()
+        self.queue_handler = _RecordQueueHandler(self.queue)
+        self.listener = QueueListener(self.queue, *self._handlers, respect_handler_level=self.respect_handler_level)
+        self.listener.start()
+
+    def _restart(self):
+        # обработчик, закрытый при перенастройке логирования, в дочернем процессе не нужен
+        if not self._closed:
+            self._start()
+
+    def close(self):
+        # logging.shutdown при выходе из процесса: дописать очередь до закрытия файловых обработчиков
+        if self.listener._thread is not None:
+            self.listener.stop()
+        super().close()
+
+    def emit(self, record):
+        self.queue_handler.emit(record)
@@ -91,3 +91,25 @@ def generate_unique_characteristic_value_slug(klass, field, obj):
         unique_slug = f"{origin_slug}-{numb}"
         numb += 1
     return unique_slug
+
+
+# ячейки, которые Excel и LibreOffice считают формулой
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def csv_safe(value):
+    """
+    Значение ячейки CSV, которое не выполнится как формула при открытии файла
+    """
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def csv_unsafe(value):
+    """
+    Обратное преобразование csv_safe для импорта выгруженного файла
+    """
+    if isinstance(value, str) and value.startswith("'") and value[1:].startswith(FORMULA_PREFIXES):
+        return value[1:]
+    return value
@@ -1,8 +1,24 @@
 from typing import Any
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.http import HttpRequest
 from parler.admin import TranslatableAdmin, TranslatableTabularInline
 from .models import *
+from apps.products import catalog_types
+from .metadata import schedule_metadata_regeneration
+
+
+def run_metadata_generation(model_admin, request, queryset, entity_type):
+    ids = queryset.values_list("pk", flat=True)
+    result = schedule_metadata_regeneration(entity_type, ids)
+    if result is None:
+        model_admin.message_user(request, "Генерация метаданных запущена в фоне", messages.INFO)
+    else:
+        model_admin.message_user(
+            request,
+            f"Метаданные сгенерированны: изменено {result['updated']}, "
+            f"создано {result['created']}, без изменений {result['unchanged']}",
+            messages.SUCCESS,
+        )
 
 
 # Register your models here.
@@ -92,21 +108,7 @@ class SEOCategoryPageAdmin(TranslatableAdmin):
 
     @admin.action(description="Сгенерировать метаданные")
     def generate_meta(self, request, queryset):
-        rule = MetaGenerationRule.objects.get(type="ctg")
-        for seo in queryset:
-            category = seo.category
-            for translation in category.translations.all():
-                if rule.has_translation(translation.language_code):
-                    rule.set_current_language(translation.language_code)
-                    title = rule.title.format(name=translation.name, description=translation.description)
-                    description = rule.description.format(name=translation.name, description=translation.description)
-                else:
-                    title = translation.name
-                    description = translation.description
-                seo.set_current_language(translation.language_code)
-                seo.title = title
-                seo.description = description
-            seo.save()
+        run_metadata_generation(self, request, queryset, catalog_types.CATEGORY)
 
 
 admin.site.register(SEOCategoryPage, SEOCategoryPageAdmin)
@@ -140,21 +142,7 @@ class SEOTagPageAdmin(TranslatableAdmin):
 
     @admin.action(description="Сгенерировать метаданные")
     def generate_meta(self, request, queryset):
-        rule = MetaGenerationRule.objects.get(type="tag")
-        for seo in queryset:
-            tag = seo.tag
-            for translation in tag.translations.all():
-                if rule.has_translation(translation.language_code):
-                    rule.set_current_language(translation.language_code)
-                    title = rule.title.format(name=translation.name)
-                    description = rule.description.format(name=translation.name)
-                else:
-                    title = translation.name
-                    description = translation.name
-                seo.set_current_language(translation.language_code)
-                seo.title = title
-                seo.description = description
-            seo.save()
+        run_metadata_generation(self, request, queryset, catalog_types.TAG)
 
 
 admin.site.register(SEOTagPage, SEOTagPageAdmin)
@@ -188,36 +176,7 @@ class SEOProductPageAdmin(TranslatableAdmin):
 
     @admin.action(description="Сгенерировать метаданные")
     def generate_meta(self, request, queryset):
-        rule = MetaGenerationRule.objects.get(type="prd")
-        for seo in queryset:
-            product = seo.product
-            for translation in product.translations.all():
-                lang = translation.language_code
-                if rule.has_translation(lang):
-                    rule.set_current_language(lang)
-
-                    price = product.current_price or product.actual_price or ""
-                    cats_q = product.sub_categories.language(lang).filter(translations__language_code=lang)
-                    cats = ", ".join([c.name for c in cats_q])
-                    chars_q = product.productcharacteristic_set.all()
-                    chars = []
-                    for char in chars_q:
-                        char_key = char.characteristic
-                        char_value = char.characteristic_value
-                        char_key.set_current_language(lang)
-                        char_value.set_current_language(lang)
-                        chars.append("{} - {}".format(char_key.name, char_value.name))
-                    chars = "; ".join(chars)
-
-                    title = rule.title.format(name=translation.name, price=price, cats=cats, chars=chars)
-                    description = rule.description.format(name=translation.name, price=price, cats=cats, chars=chars)
-                else:
-                    title = translation.name
-                    description = translation.name
-                seo.set_current_language(lang)
-                seo.title = title
-                seo.description = description
-            seo.save()
+        run_metadata_generation(self, request, queryset, catalog_types.PRODUCT)
 
 
 admin.site.register(SEOProductPage, SEOProductPageAdmin)
@@ -359,3 +318,20 @@ class CityAdmin(admin.ModelAdmin):
 
 
 admin.site.register(City, CityAdmin)
+
+
+class SitemapShardAdmin(admin.ModelAdmin):
+    list_display = ("name", "section", "lang", "url_count", "built_at", "build_time")
+    list_filter = ("section", "lang")
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+admin.site.register(SitemapShard, SitemapShardAdmin)
@@ -0,0 +1,70 @@
+from collections import defaultdict
+from apps.products import catalog_types
+from apps.products.models import Product, SubCategory, Tag
+from apps.blog.models import Post
+from .models import EntityAlternates
+
+POST = "post"
+
+ALTERNATE_ENTITIES = {
+    catalog_types.PRODUCT: Product,
+    catalog_types.CATEGORY: SubCategory,
+    catalog_types.TAG: Tag,
+    POST: Post,
+}
+
+
+def collect_alternates(EntityModel, ids):
+    """
+    {id: {язык: {"slug": ..., "last_modified": ...}}} по переводам сущностей
+    """
+    TranslationModel = EntityModel._parler_meta.root_model
+    result = defaultdict(dict)
+    for master_id, lang, slug, last_modified in TranslationModel.objects.filter(master_id__in=ids).values_list(
+        "master_id", "language_code", "slug", "last_modified"
+    ):
+        result[master_id][lang] = {
+            "slug": slug,
+            "last_modified": last_modified.isoformat() if last_modified else None,
+        }
+    return result
+
+
+def refresh_alternates(entity_type, ids):
+    """
+    Пересчет строк таблицы альтернативных языков для сущностей, строки сущностей без переводов удаляются
+    """
+    ids = set(ids)
+    alternates = collect_alternates(ALTERNATE_ENTITIES[entity_type], ids)
+    EntityAlternates.objects.bulk_create(
+        [
+            EntityAlternates(entity_type=entity_type, entity_id=pk, alternates=value)
+            for pk, value in alternates.items()
+        ],
+        update_conflicts=True,
+        unique_fields=("entity_type", "entity_id"),
+        update_fields=("alternates",),
+    )
+    missing = ids - alternates.keys()
+    if missing:
+        EntityAlternates.objects.filter(entity_type=entity_type, entity_id__in=missing).delete()
+
+
+def delete_alternates(entity_type, ids):
+    EntityAlternates.objects.filter(entity_type=entity_type, entity_id__in=ids).delete()
+
+
+def get_alternates(entity_type, entity_id):
+    return (
+        EntityAlternates.objects.filter(entity_type=entity_type, entity_id=entity_id)
+        .values_list("alternates", flat=True)
+        .first()
+        or {}
+    )
+
+
+def alternates_map(entity_type, ids=None):
+    qs = EntityAlternates.objects.filter(entity_type=entity_type)
+    if ids is not None:
+        qs = qs.filter(entity_id__in=ids)
+    return dict(qs.values_list("entity_id", "alternates"))
@@ -0,0 +1,93 @@
+import logging
+import threading
+import time
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import translation
+
+logger = logging.getLogger(__name__)
+
+
+class VersionedCache:
+    """
+    Редко меняющиеся данные в памяти процесса.
+    Сбрасывается вызовом invalidate() после коммита сохранения (см. seo.signals); другие процессы узнают
+    об изменении по версии в общем кэше (caches["shared"]), которая проверяется не чаще
+    SEO_CACHE_RECHECK_INTERVAL секунд. Если общий кэш недоступен, процесс продолжает отдавать свои данные.
+    """
+
+    version_key = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = None
+        self._version = None
+        self._checked_at = 0
+
+    def load(self):
+        raise NotImplementedError
+
+    def get_data(self):
+        now = time.monotonic()
+        if self._data is not None and now - self._checked_at < settings.SEO_CACHE_RECHECK_INTERVAL:
+            return self._data
+
+        with self._lock:
+            try:
+                version = caches["shared"].get(self.version_key)
+            except Exception:
+                logger.exception("Не удалось прочитать версию %s", self.version_key)
+                version = self._version
+            if self._data is None or version != self._version:
+                self._data = self.load()
+                self._version = version
+            self._checked_at = now
+            return self._data
+
+    def invalidate(self):
+        with self._lock:
+            self._data = None
+        cache = caches["shared"]
+        try:
+            try:
+                cache.incr(self.version_key)
+            except ValueError:
+                cache.set(self.version_key, 1, None)
+        except Exception:
+            # сохранение в админке не падает; другие процессы увидят изменение после следующей успешной смены версии
+            logger.exception("Не удалось сменить версию %s", self.version_key)
+
+
+class RobotsCache(VersionedCache):
+    version_key = "seo:robots-version"
+
+    def load(self):
+        from .models import Robots
+
+        return Robots.objects.values_list("text", flat=True).first() or ""
+
+
+class StaticPagesCache(VersionedCache):
+    """
+    {страница: {язык: ответ SEOStaticPageSerializer}}
+    """
+
+    version_key = "seo:static-pages-version"
+
+    def load(self):
+        from .models import SEOStaticPage
+        from .serializers import SEOStaticPageSerializer
+
+        pages = {}
+        # все страницы со всеми переводами, независимо от языка запроса, в котором загружается кэш
+        for page in SEOStaticPage.objects.prefetch_related("translations"):
+            pages[page.page] = {}
+            for lang in page.get_available_languages():
+                with translation.override(lang):
+                    page.set_current_language(lang)
+                    pages[page.page][lang] = SEOStaticPageSerializer(page).data
+        return pages
+
+
+robots_cache = RobotsCache()
+static_pages_cache = StaticPagesCache()
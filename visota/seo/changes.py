@@ -0,0 +1,159 @@
+from datetime import timedelta
+from django.conf import settings
+from django.utils import timezone
+from apps.products import catalog_types
+from apps.products.models import (
+    ProductCharacteristic,
+    ProductImg,
+    ProductDoc,
+    ProductRedirectFrom,
+    CategoryRedirectFrom,
+    TagRedirectFrom,
+)
+from apps.blog.models import PostRedirectFrom
+from .models import (
+    ChangeLogEntry,
+    SEOProductPage,
+    SEOCategoryPage,
+    SEOTagPage,
+    SEOPostPage,
+    City,
+    Redirect,
+)
+from .alternates import POST, ALTERNATE_ENTITIES, alternates_map
+from .slugs import CITY_SLUG_TYPES, city_slug_queryset, city_slug_rows
+
+CITY = "city"
+REDIRECT = "redirect"
+
+SEO_PAGES = {
+    catalog_types.PRODUCT: SEOProductPage,
+    catalog_types.CATEGORY: SEOCategoryPage,
+    catalog_types.TAG: SEOTagPage,
+    POST: SEOPostPage,
+}
+
+# модель: (тип, атрибут id сущности, атрибут языка или None, если изменение касается всех языков)
+TRACKED_MODELS = {
+    **{model: (entity_type, "pk", None) for entity_type, model in ALTERNATE_ENTITIES.items()},
+    **{
+        model._parler_meta.root_model: (entity_type, "master_id", "language_code")
+        for entity_type, model in ALTERNATE_ENTITIES.items()
+    },
+    **{model: (entity_type, "pk", None) for entity_type, model in SEO_PAGES.items()},
+    **{
+        model._parler_meta.root_model: (entity_type, "master_id", "language_code")
+        for entity_type, model in SEO_PAGES.items()
+    },
+    ProductCharacteristic: (catalog_types.PRODUCT, "product_id", None),
+    ProductImg: (catalog_types.PRODUCT, "product_id", None),
+    ProductDoc: (catalog_types.PRODUCT, "product_id", None),
+    ProductRedirectFrom: (catalog_types.PRODUCT, "to_id", "lang"),
+    CategoryRedirectFrom: (catalog_types.CATEGORY, "to_id", "lang"),
+    TagRedirectFrom: (catalog_types.TAG, "to_id", "lang"),
+    PostRedirectFrom: (POST, "to_id", "lang"),
+    **{CitySEOModel: (entity_type, "pk", None) for entity_type, CitySEOModel in CITY_SLUG_TYPES.items()},
+    City: (CITY, "pk", None),
+    Redirect._parler_meta.root_model: (REDIRECT, "master_id", "language_code"),
+}
+
+
+def change_key(instance):
+    entity_type, id_attr, lang_attr = TRACKED_MODELS[type(instance)]
+    return entity_type, getattr(instance, id_attr), getattr(instance, lang_attr) if lang_attr else ""
+
+
+def record_changes(keys):
+    """
+    Запись в журнал изменений ключей (тип, id, язык), пустой язык - все языки.
+    Те же ключи ставятся в outbox вебхука фронтенда, если он настроен.
+    """
+    keys = [(entity_type, pk, lang or "") for entity_type, pk, lang in keys]
+    if not keys:
+        return
+    ChangeLogEntry.objects.bulk_create(
+        [ChangeLogEntry(entity_type=entity_type, entity_id=pk, lang=lang) for entity_type, pk, lang in keys]
+    )
+    if settings.SEO_WEBHOOK_URL:
+        from .webhooks import queue_webhook_events
+
+        queue_webhook_events(keys)
+
+
+def _resolve(entity_type, keys):
+    """
+    Ключи одного типа в записи {type, id, lang, slug}; у удаленных сущностей slug None и deleted True
+    """
+    ids = {pk for pk, _ in keys}
+    pages = {}
+    if entity_type in ALTERNATE_ENTITIES:
+        for pk, alternates in alternates_map(entity_type, ids).items():
+            pages[pk] = {lang: value["slug"] for lang, value in alternates.items()}
+    elif entity_type in CITY_SLUG_TYPES:
+        for pk, lang, slug, _ in city_slug_rows(city_slug_queryset(entity_type).filter(id__in=ids)):
+            pages[pk] = {lang: slug}
+    elif entity_type == CITY:
+        for pk, lang, slug in City.objects.filter(id__in=ids).values_list("id", "lang", "slug"):
+            pages[pk] = {lang: slug}
+    elif entity_type == REDIRECT:
+        RedirectTranslation = Redirect._parler_meta.root_model
+        for pk, lang, source in RedirectTranslation.objects.filter(master_id__in=ids).values_list(
+            "master_id", "language_code", "source"
+        ):
+            pages.setdefault(pk, {})[lang] = source
+
+    result = []
+    for pk, lang in sorted(keys, key=lambda key: (key[0], key[1])):
+        slugs = pages.get(pk)
+        if slugs is None:
+            result.append({"type": entity_type, "id": pk, "lang": lang or None, "slug": None, "deleted": True})
+            continue
+        for slug_lang in [lang] if lang else sorted(slugs):
+            result.append(
+                {"type": entity_type, "id": pk, "lang": slug_lang, "slug": slugs.get(slug_lang), "deleted": False}
+            )
+    return result
+
+
+def resolve_changes(keys):
+    """
+    Ключи (тип, id, язык) без повторов в записи {type, id, lang, slug, deleted}.
+    Изменение без языка поглощает изменения той же сущности на отдельных языках.
+    """
+    grouped = {}
+    for entity_type, pk, lang in keys:
+        type_keys = grouped.setdefault(entity_type, set())
+        if (pk, "") in type_keys:
+            continue
+        if not lang:
+            type_keys.difference_update({key for key in type_keys if key[0] == pk})
+        type_keys.add((pk, lang))
+
+    changes = []
+    for entity_type, type_keys in grouped.items():
+        changes.extend(_resolve(entity_type, type_keys))
+    return changes
+
+
+def changes_since(cursor=0, limit=None):
+    """
+    Изменения после курсора (id последней прочитанной записи журнала) без повторов.
+    Возвращает (изменения, новый курсор, есть ли еще записи).
+    """
+    limit = limit or settings.SEO_CHANGES_PAGE_SIZE
+    entries = list(
+        ChangeLogEntry.objects.filter(id__gt=cursor)
+        .order_by("id")
+        .values_list("id", "entity_type", "entity_id", "lang")[: limit + 1]
+    )
+    more = len(entries) > limit
+    entries = entries[:limit]
+    if not entries:
+        return [], cursor, False
+    return resolve_changes(entry[1:] for entry in entries), entries[-1][0], more
+
+
+def prune_change_log():
+    border = timezone.now() - timedelta(days=settings.SEO_CHANGES_RETENTION_DAYS)
+    deleted, _ = ChangeLogEntry.objects.filter(changed_at__lt=border).delete()
+    return deleted
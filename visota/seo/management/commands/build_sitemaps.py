@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+from seo.sitemaps import build_sitemaps, SitemapsLocked
+
+
+class Command(BaseCommand):
+    help = "Генерация файлов sitemap в SITEMAP_ROOT"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--full", action="store_true", help="Перегенерировать все файлы, включая файлы городов")
+        parser.add_argument("--async", action="store_true", dest="run_async", help="Запустить в celery")
+
+    def handle(self, *args, full=False, run_async=False, **options):
+        if run_async:
+            from seo.tasks import build_sitemaps_task
+
+            build_sitemaps_task.delay(full=full)
+            self.stdout.write("Генерация sitemap поставлена в очередь")
+            return
+
+        try:
+            shards = build_sitemaps(full=full)
+        except SitemapsLocked:
+            raise CommandError("Sitemap сейчас генерирует другой процесс, повторите позже")
+        self.stdout.write(
+            self.style.SUCCESS(f"Перегенерировано файлов sitemap: {len(shards)}, url: {sum(shards.values())}")
+        )
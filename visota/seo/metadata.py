@@ -0,0 +1,284 @@
+from collections import defaultdict
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+from parler import appsettings
+from apps.products import catalog_types
+from apps.products.models import Product, SubCategory, Tag, ProductCharacteristic, Characteristic, CharacteristicValue
+from .models import MetaGenerationRule, SEOProductPage, SEOCategoryPage, SEOTagPage, CitySEORefresh
+from .rules import rule_registry
+from .changes import record_changes
+
+CHUNK_SIZE = 500
+CITY_REFRESH_CACHE_KEY = "seo:city-refresh-scheduled"
+
+ENTITIES = {
+    catalog_types.PRODUCT: (Product, SEOProductPage),
+    catalog_types.CATEGORY: (SubCategory, SEOCategoryPage),
+    catalog_types.TAG: (Tag, SEOTagPage),
+}
+
+
+def chunked(items, size=CHUNK_SIZE):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
+def translated_names(Model, ids, field="name"):
+    """
+    {(id, язык): значение} для переводимого поля сразу по всем объектам
+    """
+    TranslationModel = Model._parler_meta.root_model
+    rows = TranslationModel.objects.filter(master_id__in=ids).values_list("master_id", "language_code", field)
+    return {(master_id, lang): value for master_id, lang, value in rows}
+
+
+def pick_translation(values, pk, lang):
+    for code in [lang] + appsettings.PARLER_LANGUAGES.get_fallback_languages(lang):
+        if (pk, code) in values:
+            return values[(pk, code)]
+    return ""
+
+
+def get_rule(rule_type):
+    try:
+        return rule_registry.get(rule_type)
+    except MetaGenerationRule.DoesNotExist:
+        return None
+
+
+def _uses(rule, *names):
+    if rule is None:
+        return False
+    return any(
+        name in template.fields
+        for translation in rule.translations.values()
+        for template in translation
+        for name in names
+    )
+
+
+def product_prices(ids):
+    return {
+        pk: current_price or actual_price or ""
+        for pk, current_price, actual_price in Product.objects.filter(pk__in=ids).values_list(
+            "pk", "current_price", "actual_price"
+        )
+    }
+
+
+def _product_context(ids, names, rule):
+    context = {}
+    prices = product_prices(ids)
+
+    cats = {}
+    if _uses(rule, "cats"):
+        product_cats = defaultdict(list)
+        for product_id, cat_id in Product.sub_categories.through.objects.filter(product_id__in=ids).values_list(
+            "product_id", "subcategory_id"
+        ):
+            product_cats[product_id].append(cat_id)
+        cat_names = translated_names(SubCategory, {cat_id for cat_ids in product_cats.values() for cat_id in cat_ids})
+        for pk, lang in names:
+            cats[(pk, lang)] = ", ".join(
+                cat_names[(cat_id, lang)] for cat_id in product_cats[pk] if (cat_id, lang) in cat_names
+            )
+
+    chars = {}
+    if _uses(rule, "chars"):
+        product_chars = defaultdict(list)
+        for product_id, key, value in ProductCharacteristic.objects.filter(product_id__in=ids).values_list(
+            "product_id", "characteristic_id", "characteristic_value_id"
+        ):
+            product_chars[product_id].append((key, value))
+        key_names = translated_names(Characteristic, {key for pairs in product_chars.values() for key, _ in pairs})
+        value_names = translated_names(
+            CharacteristicValue, {value for pairs in product_chars.values() for _, value in pairs}
+        )
+        for pk, lang in names:
+            chars[(pk, lang)] = "; ".join(
+                "{} - {}".format(pick_translation(key_names, key, lang), pick_translation(value_names, value, lang))
+                for key, value in product_chars[pk]
+            )
+
+    for pk, lang in names:
+        context[(pk, lang)] = {
+            "price": prices.get(pk, ""),
+            "cats": cats.get((pk, lang), ""),
+            "chars": chars.get((pk, lang), ""),
+        }
+    return context
+
+
+def _generate_chunk(entity_type, ids, rule):
+    EntityModel, SEOModel = ENTITIES[entity_type]
+    SEOTranslation = SEOModel._parler_meta.root_model
+
+    ids = list(SEOModel.objects.filter(pk__in=ids).values_list("pk", flat=True))
+    names = translated_names(EntityModel, ids)
+    context = _product_context(ids, names, rule) if entity_type == catalog_types.PRODUCT else {}
+    existing = {(t.master_id, t.language_code): t for t in SEOTranslation.objects.filter(master_id__in=ids)}
+
+    changed = []
+    created = []
+    unchanged = 0
+    for (pk, lang), name in names.items():
+        if rule is not None and rule.has_translation(lang):
+            rule_translation = rule.translations[lang]
+            kwargs = {"name": name, **context.get((pk, lang), {})}
+            title = rule_translation.title.format(**kwargs)
+            description = rule_translation.description.format(**kwargs)
+        else:
+            title = name
+            description = name
+
+        translation = existing.get((pk, lang))
+        if translation is None:
+            created.append(SEOTranslation(master_id=pk, language_code=lang, title=title, description=description))
+        elif translation.title == title and translation.description == description:
+            unchanged += 1
+        else:
+            translation.title = title
+            translation.description = description
+            changed.append(translation)
+
+    if changed:
+        SEOTranslation.objects.bulk_update(changed, ["title", "description"])
+    if created:
+        SEOTranslation.objects.bulk_create(created)
+    record_changes((entity_type, t.master_id, t.language_code) for t in changed + created)
+
+    return {"updated": len(changed), "created": len(created), "unchanged": unchanged}
+
+
+def regenerate_metadata(entity_type, ids):
+    """
+    Генерация title и description SEO страниц товаров, категорий или тегов по правилам генерации.
+    Все данные загружаются пачками, изменения сохраняются через bulk_update.
+    """
+    rule = get_rule(MetaGenerationRule.get_default_type(entity_type))
+    result = {"updated": 0, "created": 0, "unchanged": 0}
+    for chunk in chunked(ids):
+        for key, value in _generate_chunk(entity_type, chunk, rule).items():
+            result[key] += value
+    return result
+
+
+def schedule_metadata_regeneration(entity_type, ids):
+    """
+    Большие выборки отправляются в celery, возвращает None в этом случае
+    """
+    ids = list(ids)
+    if len(ids) > settings.SEO_METADATA_ASYNC_THRESHOLD:
+        from .tasks import regenerate_metadata_task
+
+        regenerate_metadata_task.delay(entity_type, ids)
+        return None
+    return regenerate_metadata(entity_type, ids)
+
+
+# City SEO
+def _generate_city_chunk(entity_type, ids, rule):
+    EntityModel = ENTITIES[entity_type][0]
+    CitySEOModel = EntityModel.city_set.through
+
+    names = translated_names(EntityModel, ids)
+    prices = product_prices(ids) if entity_type == catalog_types.PRODUCT else {}
+    rows = (
+        CitySEOModel.objects.filter(entity_id__in=ids)
+        .select_related("city")
+        .only("entity_id", "title", "description", "city__name", "city__lang")
+    )
+
+    changed = []
+    unchanged = 0
+    for seo in rows:
+        lang = seo.city.lang
+        translation = rule.for_language(lang) if rule is not None else None
+        if translation is None:
+            continue
+        kwargs = {"name": pick_translation(names, seo.entity_id, lang), "city": seo.city.name}
+        if entity_type == catalog_types.PRODUCT:
+            kwargs["price"] = prices.get(seo.entity_id, "")
+        title = translation.title.format(**kwargs)
+        description = translation.description.format(**kwargs)
+
+        if seo.title == title and seo.description == description:
+            unchanged += 1
+            continue
+        seo.title = title
+        seo.description = description
+        changed.append(seo)
+
+    if changed:
+        CitySEOModel.objects.bulk_update(changed, ["title", "description"])
+        record_changes((f"city-{entity_type}", seo.pk, "") for seo in changed)
+
+    return {"updated": len(changed), "unchanged": unchanged}
+
+
+def regenerate_city_metadata(entity_type, ids):
+    """
+    Генерация title и description SEO по городам для выбранных товаров, категорий или тегов
+    """
+    rule = get_rule(MetaGenerationRule.get_city_type(entity_type))
+    result = {"updated": 0, "unchanged": 0}
+    for chunk in chunked(ids):
+        for key, value in _generate_city_chunk(entity_type, chunk, rule).items():
+            result[key] += value
+    return result
+
+
+def schedule_city_metadata_regeneration(entity_type, ids):
+    ids = list(ids)
+    if len(ids) > settings.SEO_METADATA_ASYNC_THRESHOLD:
+        from .tasks import regenerate_city_metadata_task
+
+        regenerate_city_metadata_task.delay(entity_type, ids)
+        return None
+    return regenerate_city_metadata(entity_type, ids)
+
+
+def queue_city_metadata_refresh(entity_type, ids):
+    """
+    Ставит сущности в очередь на обновление SEO по городам.
+    Задача celery запускается не чаще одного раза за SEO_CITY_REFRESH_DELAY секунд (ключ в общем кэше,
+    одна задача на все процессы) и обрабатывает всё, что накопилось в очереди.
+    Повторная постановка уже стоящей в очереди сущности обновляет queued_at.
+    """
+    CitySEORefresh.objects.bulk_create(
+        [CitySEORefresh(entity_type=entity_type, entity_id=pk) for pk in ids],
+        update_conflicts=True,
+        unique_fields=("entity_type", "entity_id"),
+        update_fields=("queued_at",),
+    )
+    if caches["shared"].add(CITY_REFRESH_CACHE_KEY, True, settings.SEO_CITY_REFRESH_DELAY):
+        from .tasks import refresh_queued_city_metadata_task
+
+        refresh_queued_city_metadata_task.apply_async(countdown=settings.SEO_CITY_REFRESH_DELAY)
+
+
+def refresh_queued_city_metadata():
+    """
+    Строки очереди удаляются только после обновления и только если их не поставили заново во время обработки
+    (queued_at позже начала пачки): такие обработает следующий запуск. При ошибке строки остаются в очереди.
+    """
+    result = {"updated": 0, "unchanged": 0}
+    last_id = 0
+    while True:
+        started_at = timezone.now()
+        queue = CitySEORefresh.objects.filter(id__gt=last_id).order_by("id")
+        batch = list(queue.values_list("id", "entity_type", "entity_id")[:CHUNK_SIZE])
+        if not batch:
+            break
+        last_id = batch[-1][0]
+
+        grouped = defaultdict(list)
+        for _, entity_type, entity_id in batch:
+            grouped[entity_type].append(entity_id)
+        for entity_type, ids in grouped.items():
+            for key, value in regenerate_city_metadata(entity_type, ids).items():
+                result[key] += value
+        CitySEORefresh.objects.filter(id__in=[row[0] for row in batch], queued_at__lte=started_at).delete()
+    return result
@@ -0,0 +1,51 @@
+# Generated by Django 5.0.3 on 2026-10-19 17:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("seo", "0023_change_metagenerationrule_instruction"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CitySEORefresh",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "entity_type",
+                    models.CharField(
+                        choices=[
+                            ("product", "Товар"),
+                            ("category", "Категория"),
+                            ("tag", "Тег"),
+                        ],
+                        max_length=16,
+                        verbose_name="тип",
+                    ),
+                ),
+                ("entity_id", models.PositiveBigIntegerField()),
+                ("queued_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "verbose_name": "обновление SEO по городам",
+                "verbose_name_plural": "обновления SEO по городам",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="cityseorefresh",
+            constraint=models.UniqueConstraint(
+                fields=("entity_type", "entity_id"), name="unique_city_seo_refresh"
+            ),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.0.3 on 2026-10-19 17:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("seo", "0024_cityseorefresh"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CitySitemapRefresh",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("city_id", models.PositiveBigIntegerField(unique=True)),
+                ("queued_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "verbose_name": "обновление sitemap города",
+                "verbose_name_plural": "обновления sitemap городов",
+            },
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.0.3 on 2026-10-19 17:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("seo", "0025_citysitemaprefresh"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SitemapShard",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "name",
+                    models.CharField(max_length=255, unique=True, verbose_name="файл"),
+                ),
+                ("section", models.CharField(max_length=16, verbose_name="раздел")),
+                (
+                    "lang",
+                    models.CharField(
+                        choices=[
+                            ("ru", "Русский"),
+                            ("en", "Английский"),
+                            ("tr", "Турецкий"),
+                            ("zh", "Китайский"),
+                        ],
+                        max_length=2,
+                        verbose_name="язык",
+                    ),
+                ),
+                (
+                    "url_count",
+                    models.PositiveIntegerField(verbose_name="количество url"),
+                ),
+                (
+                    "checksum",
+                    models.CharField(
+                        blank=True, max_length=32, verbose_name="контрольная сумма"
+                    ),
+                ),
+                ("built_at", models.DateTimeField(verbose_name="сгенерирован")),
+                ("build_time", models.FloatField(verbose_name="время генерации, сек")),
+            ],
+            options={
+                "verbose_name": "файл sitemap",
+                "verbose_name_plural": "файлы sitemap",
+                "ordering": ("name",),
+            },
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 5.0.3 on 2026-10-19 17:20
+
+from django.db import migrations, models
+
+
+ENTITIES = {
+    "product": ("products", "ProductTranslation"),
+    "category": ("products", "SubCategoryTranslation"),
+    "tag": ("products", "TagTranslation"),
+    "post": ("blog", "PostTranslation"),
+}
+
+
+def fill_alternates(apps, schema_editor):
+    EntityAlternates = apps.get_model("seo", "EntityAlternates")
+    for entity_type, (app_label, model_name) in ENTITIES.items():
+        TranslationModel = apps.get_model(app_label, model_name)
+        alternates = {}
+        for master_id, lang, slug, last_modified in TranslationModel.objects.values_list(
+            "master_id", "language_code", "slug", "last_modified"
+        ):
+            alternates.setdefault(master_id, {})[lang] = {
+                "slug": slug,
+                "last_modified": last_modified.isoformat() if last_modified else None,
+            }
+        EntityAlternates.objects.bulk_create(
+            [EntityAlternates(entity_type=entity_type, entity_id=pk, alternates=value) for pk, value in alternates.items()],
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("seo", "0026_sitemapshard"),
+        ("products", "0026_alter_subcategory_category"),
+        ("blog", "0008_alter_postredirectfrom_options_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EntityAlternates",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("entity_type", models.CharField(max_length=16, verbose_name="тип")),
+                ("entity_id", models.PositiveBigIntegerField()),
+                (
+                    "alternates",
+                    models.JSONField(default=dict, verbose_name="языковые версии"),
+                ),
+            ],
+            options={
+                "verbose_name": "языковые версии сущности",
+                "verbose_name_plural": "языковые версии сущностей",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="entityalternates",
+            constraint=models.UniqueConstraint(
+                fields=("entity_type", "entity_id"), name="unique_entity_alternates"
+            ),
+        ),
+        migrations.RunPython(fill_alternates, migrations.RunPython.noop),
+    ]
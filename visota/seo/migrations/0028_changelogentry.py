@@ -0,0 +1,43 @@
+# Generated by Django 5.0.3 on 2026-10-19 17:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("seo", "0027_entityalternates"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ChangeLogEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("entity_type", models.CharField(max_length=32, verbose_name="тип")),
+                ("entity_id", models.PositiveBigIntegerField()),
+                (
+                    "lang",
+                    models.CharField(blank=True, max_length=2, verbose_name="язык"),
+                ),
+                (
+                    "changed_at",
+                    models.DateTimeField(
+                        auto_now_add=True, db_index=True, verbose_name="изменено"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "изменение",
+                "verbose_name_plural": "журнал изменений",
+            },
+        ),
+    ]
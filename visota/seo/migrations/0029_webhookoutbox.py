@@ -0,0 +1,45 @@
+# Generated by Django 5.0.3 on 2026-10-19 17:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("seo", "0028_changelogentry"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="WebhookOutbox",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("entity_type", models.CharField(max_length=32, verbose_name="тип")),
+                ("entity_id", models.PositiveBigIntegerField()),
+                (
+                    "lang",
+                    models.CharField(blank=True, max_length=2, verbose_name="язык"),
+                ),
+                ("queued_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "verbose_name": "событие вебхука",
+                "verbose_name_plural": "outbox вебхука",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="webhookoutbox",
+            constraint=models.UniqueConstraint(
+                fields=("entity_type", "entity_id", "lang"),
+                name="unique_webhook_outbox",
+            ),
+        ),
+    ]
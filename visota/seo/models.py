@@ -5,7 +5,7 @@ from typing import Iterable
 from django.conf import settings
 from django.core.files import File
 from django.core.files.base import ContentFile
-from django.db import models
+from django.db import models, transaction
 from django.core.validators import MaxValueValidator, MinValueValidator, URLValidator, RegexValidator
 from parler.models import TranslatableModel, TranslatedFields
 from apps.products.models import SubCategory, Product, Tag
@@ -13,6 +13,7 @@ from apps.blog.models import Post
 from common.utils import generate_unique_slug
 from django_ckeditor_5.fields import CKEditor5Field
 from apps.products import catalog_types
+from .rules import rule_registry
 
 
 # Create your models here.
@@ -126,14 +127,10 @@ class SEOGenerationMixin:
         setattr(self, "_seo_generation_rule", rule)
 
     def generate_seo_title(self, lang, name):
-        rule = self._get_seo_generation_rule()
-        rule.set_current_language(lang)
-        return rule.title.format(name=name)
+        return self._get_seo_generation_rule().title(lang, name=name)
 
     def generate_seo_description(self, lang, name):
-        rule = self._get_seo_generation_rule()
-        rule.set_current_language(lang)
-        return rule.description.format(name=name)
+        return self._get_seo_generation_rule().description(lang, name=name)
 
     def generate_seo_title_by_entity(self, entity):
         return self.generate_seo_title(entity.get_current_language(), entity.name)
@@ -171,7 +168,7 @@ class SEOCategoryPage(TranslatableModel, SEOGenerationMixin):
 
     @staticmethod
     def get_default_seo_generation_rule():
-        return MetaGenerationRule.objects.get(type=MetaGenerationRule.get_default_type(catalog_types.CATEGORY))
+        return rule_registry.get(MetaGenerationRule.get_default_type(catalog_types.CATEGORY))
 
 
 class SEOTagPage(TranslatableModel, SEOGenerationMixin):
@@ -201,7 +198,7 @@ class SEOTagPage(TranslatableModel, SEOGenerationMixin):
 
     @staticmethod
     def get_default_seo_generation_rule():
-        return MetaGenerationRule.objects.get(type=MetaGenerationRule.get_default_type(catalog_types.TAG))
+        return rule_registry.get(MetaGenerationRule.get_default_type(catalog_types.TAG))
 
 
 class SEOProductPage(TranslatableModel, SEOGenerationMixin):
@@ -233,17 +230,13 @@ class SEOProductPage(TranslatableModel, SEOGenerationMixin):
 
     @staticmethod
     def get_default_seo_generation_rule():
-        return MetaGenerationRule.objects.get(type=MetaGenerationRule.get_default_type(catalog_types.PRODUCT))
+        return rule_registry.get(MetaGenerationRule.get_default_type(catalog_types.PRODUCT))
 
     def generate_seo_title(self, lang, name, price):
-        rule = self._get_seo_generation_rule()
-        rule.set_current_language(lang)
-        return rule.title.format(name=name, price=price)
+        return self._get_seo_generation_rule().title(lang, name=name, price=price)
 
     def generate_seo_description(self, lang, name, price):
-        rule = self._get_seo_generation_rule()
-        rule.set_current_language(lang)
-        return rule.description.format(name=name, price=price)
+        return self._get_seo_generation_rule().description(lang, name=name, price=price)
 
     def generate_seo_title_by_entity(self, entity):
         price = entity.current_price or entity.actual_price or ""
@@ -494,8 +487,7 @@ class CitySEO(models.Model, SEOGenerationMixin):
 
     @classmethod
     def bind_entity_to_cities(cls, entity, cities):
-        rule = cls.get_default_seo_generation_rule()
-        rule.set_current_language(entity.get_current_language())
+        rule = cls.get_default_seo_generation_rule().for_language(entity.get_current_language())
         seo_list = []
         for city in cities:
             header = entity.name
@@ -503,21 +495,23 @@ class CitySEO(models.Model, SEOGenerationMixin):
             description = cls.generate_seo_data(entity=entity, city_name=city.name, rule=rule.description)
             seo = cls(entity=entity, city=city, header=header, title=title, description=description)
             seo_list.append(seo)
-        return cls.objects.bulk_create(seo_list)
+        created = cls.objects.bulk_create(seo_list)
+
+        from .sitemaps import queue_city_sitemap_refresh
+
+        city_ids = [city.pk for city in cities]
+        transaction.on_commit(lambda: queue_city_sitemap_refresh(city_ids))
+        return created
 
     @staticmethod
     def generate_seo_data(entity, city_name, rule):
         return rule.format(name=entity.name, city=city_name)
 
     def generate_seo_title(self, lang, name, city_name):
-        rule = self._get_seo_generation_rule()
-        rule.set_current_language(lang)
-        return rule.title.format(name=name, city=city_name)
+        return self._get_seo_generation_rule().title(lang, name=name, city=city_name)
 
     def generate_seo_description(self, lang, name, city_name):
-        rule = self._get_seo_generation_rule()
-        rule.set_current_language(lang)
-        return rule.description.format(name=name, city=city_name)
+        return self._get_seo_generation_rule().description(lang, name=name, city=city_name)
 
     def generate_seo_title_by_entity(self, entity, city_name):
         return self.generate_seo_title(entity.get_current_language(), entity.name, city_name)
@@ -543,14 +537,10 @@ class CityProductSEO(CitySEO):
         return rule.format(name=entity.name, city=city_name, price=price)
 
     def generate_seo_title(self, lang, name, city_name, price):
-        rule = self._get_seo_generation_rule()
-        rule.set_current_language(lang)
-        return rule.title.format(name=name, city=city_name, price=price)
+        return self._get_seo_generation_rule().title(lang, name=name, city=city_name, price=price)
 
     def generate_seo_description(self, lang, name, city_name, price):
-        rule = self._get_seo_generation_rule()
-        rule.set_current_language(lang)
-        return rule.description.format(name=name, city=city_name, price=price)
+        return self._get_seo_generation_rule().description(lang, name=name, city=city_name, price=price)
 
     def generate_seo_title_by_entity(self, entity, city_name):
         price = entity.current_price or entity.actual_price or ""
@@ -562,7 +552,7 @@ class CityProductSEO(CitySEO):
 
     @staticmethod
     def get_default_seo_generation_rule():
-        return MetaGenerationRule.objects.get(type=MetaGenerationRule.get_city_type(catalog_types.PRODUCT))
+        return rule_registry.get(MetaGenerationRule.get_city_type(catalog_types.PRODUCT))
 
 
 class CityCategorySEO(CitySEO):
@@ -579,7 +569,7 @@ class CityCategorySEO(CitySEO):
 
     @staticmethod
     def get_default_seo_generation_rule():
-        return MetaGenerationRule.objects.get(type=MetaGenerationRule.get_city_type(catalog_types.CATEGORY))
+        return rule_registry.get(MetaGenerationRule.get_city_type(catalog_types.CATEGORY))
 
 
 class CityTagSEO(CitySEO):
@@ -596,4 +586,123 @@ class CityTagSEO(CitySEO):
 
     @staticmethod
     def get_default_seo_generation_rule():
-        return MetaGenerationRule.objects.get(type=MetaGenerationRule.get_city_type(catalog_types.TAG))
+        return rule_registry.get(MetaGenerationRule.get_city_type(catalog_types.TAG))
+
+
+class CitySEORefresh(models.Model):
+    """
+    Очередь сущностей, для которых нужно обновить SEO по городам
+    """
+
+    entity_type = models.CharField(
+        "тип",
+        max_length=16,
+        choices={catalog_types.PRODUCT: "Товар", catalog_types.CATEGORY: "Категория", catalog_types.TAG: "Тег"},
+    )
+    entity_id = models.PositiveBigIntegerField()
+    queued_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "обновление SEO по городам"
+        verbose_name_plural = "обновления SEO по городам"
+        constraints = [
+            models.UniqueConstraint(
+                fields=("entity_type", "entity_id"),
+                name="unique_city_seo_refresh",
+            ),
+        ]
+
+
+class CitySitemapRefresh(models.Model):
+    """
+    Очередь городов, для которых нужно перегенерировать файлы sitemap
+    """
+
+    city_id = models.PositiveBigIntegerField(unique=True)
+    queued_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "обновление sitemap города"
+        verbose_name_plural = "обновления sitemap городов"
+
+
+class SitemapShard(models.Model):
+    """
+    Файл sitemap: по контрольной сумме определяется, нужно ли его перегенерировать
+    """
+
+    name = models.CharField("файл", max_length=255, unique=True)
+    section = models.CharField("раздел", max_length=16)
+    lang = models.CharField("язык", max_length=2, choices=settings.LANGUAGES)
+    url_count = models.PositiveIntegerField("количество url")
+    checksum = models.CharField("контрольная сумма", max_length=32, blank=True)
+    built_at = models.DateTimeField("сгенерирован")
+    build_time = models.FloatField("время генерации, сек")
+
+    class Meta:
+        verbose_name = "файл sitemap"
+        verbose_name_plural = "файлы sitemap"
+        ordering = ("name",)
+
+    def __str__(self):
+        return self.name
+
+
+class EntityAlternates(models.Model):
+    """
+    Slug и дата изменения сущности на всех языках: {язык: {"slug": ..., "last_modified": ...}}.
+    Обновляется при сохранении перевода (см. seo.signals), читается метатегами и sitemap
+    вместо переводов сущности.
+    """
+
+    entity_type = models.CharField("тип", max_length=16)
+    entity_id = models.PositiveBigIntegerField()
+    alternates = models.JSONField("языковые версии", default=dict)
+
+    class Meta:
+        verbose_name = "языковые версии сущности"
+        verbose_name_plural = "языковые версии сущностей"
+        constraints = [
+            models.UniqueConstraint(
+                fields=("entity_type", "entity_id"),
+                name="unique_entity_alternates",
+            ),
+        ]
+
+
+class ChangeLogEntry(models.Model):
+    """
+    Журнал изменений страниц для инкрементальной перегенерации фронтенда, только добавление записей.
+    Курсор для чтения - id записи.
+    """
+
+    entity_type = models.CharField("тип", max_length=32)
+    entity_id = models.PositiveBigIntegerField()
+    lang = models.CharField("язык", max_length=2, blank=True)
+    changed_at = models.DateTimeField("изменено", auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name = "изменение"
+        verbose_name_plural = "журнал изменений"
+
+
+class WebhookOutbox(models.Model):
+    """
+    Изменения, которые еще не доставлены вебхуком фронтенда.
+    Одна строка на ключ: повторные изменения за время ожидания отправки схлопываются.
+    """
+
+    entity_type = models.CharField("тип", max_length=32)
+    entity_id = models.PositiveBigIntegerField()
+    lang = models.CharField("язык", max_length=2, blank=True)
+    queued_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "событие вебхука"
+        verbose_name_plural = "outbox вебхука"
+        constraints = [
+            models.UniqueConstraint(
+                fields=("entity_type", "entity_id", "lang"),
+                name="unique_webhook_outbox",
+            ),
+        ]
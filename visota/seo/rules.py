@@ -0,0 +1,95 @@
+from string import Formatter
+from parler import appsettings
+from .cache import VersionedCache
+
+VERSION_CACHE_KEY = "seo:rules-version"
+
+
+class CompiledTemplate:
+    """
+    Шаблон правила генерации, разобранный один раз.
+    Совместим с str.format: template.format(name=..., price=...)
+    """
+
+    def __init__(self, template):
+        self.template = template
+        self.parts = []
+        self.simple = True
+        for literal, field, spec, conversion in Formatter().parse(template):
+            if field is not None and (spec or conversion or not field.isidentifier()):
+                self.simple = False
+            self.parts.append((literal, field))
+        self.fields = {field for _, field in self.parts if field}
+
+    def format(self, **kwargs):
+        if not self.simple:
+            return self.template.format(**kwargs)
+        result = []
+        for literal, field in self.parts:
+            result.append(literal)
+            if field is not None:
+                result.append(str(kwargs[field]))
+        return "".join(result)
+
+    def __str__(self):
+        return self.template
+
+
+class CompiledRuleTranslation:
+    def __init__(self, title, description):
+        self.title = CompiledTemplate(title)
+        self.description = CompiledTemplate(description)
+
+    def __iter__(self):
+        return iter((self.title, self.description))
+
+
+class CompiledRule:
+    def __init__(self, rule_type, translations):
+        self.type = rule_type
+        self.translations = {t.language_code: CompiledRuleTranslation(t.title, t.description) for t in translations}
+
+    def has_translation(self, lang):
+        return lang in self.translations
+
+    def for_language(self, lang):
+        """
+        Перевод правила с учетом fallback языков parler, None если перевода нет
+        """
+        for code in [lang] + appsettings.PARLER_LANGUAGES.get_fallback_languages(lang):
+            if code in self.translations:
+                return self.translations[code]
+        return None
+
+    def title(self, lang, **kwargs):
+        return self.for_language(lang).title.format(**kwargs)
+
+    def description(self, lang, **kwargs):
+        return self.for_language(lang).description.format(**kwargs)
+
+
+class RuleRegistry(VersionedCache):
+    """
+    Скомпилированные правила генерации метатегов всех типов в памяти процесса
+    """
+
+    version_key = VERSION_CACHE_KEY
+
+    def get(self, rule_type):
+        from .models import MetaGenerationRule
+
+        rules = self.get_data()
+        if rule_type not in rules:
+            raise MetaGenerationRule.DoesNotExist(f"MetaGenerationRule {rule_type} does not exist")
+        return rules[rule_type]
+
+    def load(self):
+        from .models import MetaGenerationRule
+
+        return {
+            rule.type: CompiledRule(rule.type, rule.translations.all())
+            for rule in MetaGenerationRule.objects.prefetch_related("translations")
+        }
+
+
+rule_registry = RuleRegistry()
@@ -4,6 +4,8 @@ from parler_rest.serializers import TranslatableModelSerializer
 from parler_rest.fields import TranslatedFieldsField
 
 from .models import *
+from .alternates import POST, get_alternates, alternates_map
+from apps.products import catalog_types
 
 
 class SEOStaticPageSerializer(TranslatableModelSerializer):
@@ -41,10 +43,10 @@ class SEOStaticPageSerializer(TranslatableModelSerializer):
 
 
 class SEODynamicPageSerializer(TranslatableModelSerializer):
+    entity_type = None
 
     class Meta:
         fields = (
-            "entity",
             "title",
             "description",
             "noindex_follow",
@@ -56,10 +58,10 @@ class SEODynamicPageSerializer(TranslatableModelSerializer):
         if translated:
             representation = super().to_representation(instance)
 
-            translations = representation["entity"]["translations"]
+            alternates = get_alternates(self.entity_type, instance.pk)
             slug = {}
-            for key in translations:
-                slug[key] = translations[key]["slug"]
+            for key in alternates:
+                slug[key] = alternates[key]["slug"]
 
             robots = (
                 {
@@ -104,16 +106,23 @@ class SitemapStaticsSerializer(TranslatableModelSerializer):
 
 
 class SitemapDynamicSerializer(TranslatableModelSerializer):
+    entity_type = None
 
     class Meta:
-        fields = (
-            "entity",
-            "translations",
-        )
+        fields = ("translations",)
+
+    def get_alternates(self, instance):
+        """
+        Языковые версии всех сущностей типа загружаются одним запросом на весь sitemap
+        """
+        alternates = self.context.setdefault("alternates", {})
+        if self.entity_type not in alternates:
+            alternates[self.entity_type] = alternates_map(self.entity_type)
+        return alternates[self.entity_type].get(instance.pk, {})
 
     def to_representation(self, instance):
         represention = super().to_representation(instance)
-        translations = represention["entity"]["translations"]
+        translations = self.get_alternates(instance)
         seo_translations = represention["translations"]
         result = {}
         for key in translations:
@@ -129,92 +138,60 @@ class SitemapDynamicSerializer(TranslatableModelSerializer):
         return result
 
 
-class CategorySlugSerializer(TranslatableModelSerializer):
-    translations = TranslatedFieldsField(shared_model=SubCategory)
-
-    class Meta:
-        model = SubCategory
-        fields = ("translations",)
-
-
 class SEOCategoryPageSerializer(SEODynamicPageSerializer):
-    entity = CategorySlugSerializer(source="category")
+    entity_type = catalog_types.CATEGORY
 
     class Meta(SEODynamicPageSerializer.Meta):
         model = SEOCategoryPage
 
 
 class SitemapCategoriesSerializer(SitemapDynamicSerializer):
-    entity = CategorySlugSerializer(source="category")
+    entity_type = catalog_types.CATEGORY
     translations = TranslatedFieldsField(shared_model=SEOCategoryPage)
 
     class Meta(SitemapDynamicSerializer.Meta):
         model = SEOCategoryPage
 
 
-class TagSlugSerializer(TranslatableModelSerializer):
-    translations = TranslatedFieldsField(shared_model=Tag)
-
-    class Meta:
-        model = Tag
-        fields = ("translations",)
-
-
 class SEOTagPageSerializer(SEODynamicPageSerializer):
-    entity = TagSlugSerializer(source="tag")
+    entity_type = catalog_types.TAG
 
     class Meta(SEODynamicPageSerializer.Meta):
         model = SEOTagPage
 
 
 class SitemapTagSerializer(SitemapDynamicSerializer):
-    entity = TagSlugSerializer(source="tag")
+    entity_type = catalog_types.TAG
     translations = TranslatedFieldsField(shared_model=SEOTagPage)
 
     class Meta(SitemapDynamicSerializer.Meta):
         model = SEOTagPage
 
 
-class ProductSlugSerializer(TranslatableModelSerializer):
-    translations = TranslatedFieldsField(shared_model=Product)
-
-    class Meta:
-        model = Product
-        fields = ("translations",)
-
-
 class SEOProductPageSerializer(SEODynamicPageSerializer):
-    entity = ProductSlugSerializer(source="product")
+    entity_type = catalog_types.PRODUCT
 
     class Meta(SEODynamicPageSerializer.Meta):
         model = SEOProductPage
 
 
 class SitemapProductsSerializer(SitemapDynamicSerializer):
-    entity = ProductSlugSerializer(source="product")
+    entity_type = catalog_types.PRODUCT
     translations = TranslatedFieldsField(shared_model=SEOProductPage)
 
     class Meta(SitemapDynamicSerializer.Meta):
         model = SEOProductPage
 
 
-class PostSlugSerializer(TranslatableModelSerializer):
-    translations = TranslatedFieldsField(shared_model=Post)
-
-    class Meta:
-        model = Post
-        fields = ("translations",)
-
-
 class SEOPostPageSerializer(SEODynamicPageSerializer):
-    entity = PostSlugSerializer(source="post")
+    entity_type = POST
 
     class Meta(SEODynamicPageSerializer.Meta):
         model = SEOProductPage
 
 
 class SitemapPostsSerializer(SitemapDynamicSerializer):
-    entity = PostSlugSerializer(source="post")
+    entity_type = POST
     translations = TranslatedFieldsField(shared_model=SEOPostPage)
 
     class Meta(SitemapDynamicSerializer.Meta):
@@ -1,10 +1,30 @@
-from django.db.models.signals import post_save, m2m_changed
+from django.db import transaction
+from django.db.models.signals import post_init, post_save, post_delete, m2m_changed
 from apps.products.signals import full_product_save_admin, full_category_save_admin, full_tag_save_admin
 from parler.signals import post_translation_save
 from django.dispatch import receiver
 from apps.products.models import SubCategory, Product, Tag, ProductCharacteristic
 from apps.blog.models import Post
-from seo.models import SEOCategoryPage, SEOProductPage, SEOPostPage, MetaGenerationRule, SEOTagPage
+from apps.products import catalog_types
+from seo.models import (
+    SEOCategoryPage,
+    SEOProductPage,
+    SEOPostPage,
+    MetaGenerationRule,
+    SEOTagPage,
+    SEOStaticPage,
+    Robots,
+    City,
+    CityProductSEO,
+    CityCategorySEO,
+    CityTagSEO,
+)
+from seo.metadata import queue_city_metadata_refresh
+from seo.rules import rule_registry
+from seo.cache import robots_cache, static_pages_cache
+from seo.sitemaps import queue_city_sitemap_refresh, queue_entity_city_sitemap_refresh
+from seo.alternates import ALTERNATE_ENTITIES, refresh_alternates, delete_alternates
+from seo.changes import TRACKED_MODELS, change_key, record_changes
 
 
 # @receiver(post_save, sender=SubCategory, dispatch_uid="saveCategory")
@@ -116,3 +136,157 @@ def create_post_seo(sender, instance, created, **kwargs):
         seo_post_page.create_translation(
             instance.language_code, title=instance.title, description=instance.content_concise
         )
+
+
+# Отслеживание полей, от которых зависит SEO по городам
+CITY_SEO_TRACKED_FIELDS = {
+    Product: (catalog_types.PRODUCT, "id", ("current_price", "actual_price")),
+    Product._parler_meta.root_model: (catalog_types.PRODUCT, "master_id", ("name",)),
+    SubCategory._parler_meta.root_model: (catalog_types.CATEGORY, "master_id", ("name",)),
+    Tag._parler_meta.root_model: (catalog_types.TAG, "master_id", ("name",)),
+}
+
+
+def _city_seo_tracked_values(instance, fields):
+    return tuple(instance.__dict__.get(field) for field in fields)
+
+
+def remember_city_seo_values(sender, instance, **kwargs):
+    _, _, fields = CITY_SEO_TRACKED_FIELDS[sender]
+    instance._city_seo_values = _city_seo_tracked_values(instance, fields)
+
+
+def queue_city_seo_refresh(sender, instance, created, raw=False, **kwargs):
+    entity_type, id_field, fields = CITY_SEO_TRACKED_FIELDS[sender]
+    values = _city_seo_tracked_values(instance, fields)
+    previous = getattr(instance, "_city_seo_values", None)
+    instance._city_seo_values = values
+    if created or raw or previous == values:
+        return
+
+    entity_id = getattr(instance, id_field)
+    transaction.on_commit(lambda: queue_city_metadata_refresh(entity_type, [entity_id]))
+
+
+for model in CITY_SEO_TRACKED_FIELDS:
+    post_init.connect(remember_city_seo_values, sender=model, dispatch_uid=f"rememberCitySEOValues{model.__name__}")
+    post_save.connect(queue_city_seo_refresh, sender=model, dispatch_uid=f"queueCitySEORefresh{model.__name__}")
+
+
+def invalidate_rule_registry(sender, **kwargs):
+    # после коммита: иначе другой процесс может загрузить старые правила уже под новой версией
+    transaction.on_commit(rule_registry.invalidate)
+
+
+for model in (MetaGenerationRule, MetaGenerationRule._parler_meta.root_model):
+    post_save.connect(invalidate_rule_registry, sender=model, dispatch_uid=f"invalidateRules{model.__name__}")
+    post_delete.connect(invalidate_rule_registry, sender=model, dispatch_uid=f"invalidateRulesDelete{model.__name__}")
+
+
+def invalidate_robots_cache(sender, **kwargs):
+    transaction.on_commit(robots_cache.invalidate)
+
+
+def invalidate_static_pages_cache(sender, **kwargs):
+    # страница и ее переводы сохраняются в одной транзакции админки, версия меняется один раз после коммита
+    transaction.on_commit(static_pages_cache.invalidate)
+
+
+post_save.connect(invalidate_robots_cache, sender=Robots, dispatch_uid="invalidateRobots")
+post_delete.connect(invalidate_robots_cache, sender=Robots, dispatch_uid="invalidateRobotsDelete")
+
+for model in (SEOStaticPage, SEOStaticPage._parler_meta.root_model):
+    post_save.connect(invalidate_static_pages_cache, sender=model, dispatch_uid=f"invalidateStatic{model.__name__}")
+    post_delete.connect(
+        invalidate_static_pages_cache, sender=model, dispatch_uid=f"invalidateStaticDelete{model.__name__}"
+    )
+
+
+# Перегенерация sitemap городов
+CITY_SITEMAP_TRACKED_TRANSLATIONS = {
+    Product._parler_meta.root_model: catalog_types.PRODUCT,
+    SubCategory._parler_meta.root_model: catalog_types.CATEGORY,
+    Tag._parler_meta.root_model: catalog_types.TAG,
+}
+
+
+def remember_city_sitemap_slug(sender, instance, **kwargs):
+    instance._city_sitemap_slug = instance.__dict__.get("slug")
+
+
+def queue_entity_city_sitemap(sender, instance, created, raw=False, **kwargs):
+    previous = getattr(instance, "_city_sitemap_slug", None)
+    instance._city_sitemap_slug = instance.slug
+    if raw or (not created and previous == instance.slug):
+        return
+
+    entity_type = CITY_SITEMAP_TRACKED_TRANSLATIONS[sender]
+    entity_id = instance.master_id
+    transaction.on_commit(lambda: queue_entity_city_sitemap_refresh(entity_type, [entity_id]))
+
+
+for model in CITY_SITEMAP_TRACKED_TRANSLATIONS:
+    post_init.connect(remember_city_sitemap_slug, sender=model, dispatch_uid=f"rememberCitySitemapSlug{model.__name__}")
+    post_save.connect(queue_entity_city_sitemap, sender=model, dispatch_uid=f"queueEntityCitySitemap{model.__name__}")
+
+
+@receiver(post_save, sender=City, dispatch_uid="queueCitySitemapSave")
+@receiver(post_delete, sender=City, dispatch_uid="queueCitySitemapDelete")
+def queue_city_sitemap(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    city_id = instance.pk
+    transaction.on_commit(lambda: queue_city_sitemap_refresh([city_id]))
+
+
+def queue_city_seo_sitemap(sender, instance, created=True, raw=False, **kwargs):
+    if raw or not created:
+        return
+    city_id = instance.city_id
+    transaction.on_commit(lambda: queue_city_sitemap_refresh([city_id]))
+
+
+for model in (CityProductSEO, CityCategorySEO, CityTagSEO):
+    post_save.connect(queue_city_seo_sitemap, sender=model, dispatch_uid=f"queueCitySitemap{model.__name__}")
+    post_delete.connect(queue_city_seo_sitemap, sender=model, dispatch_uid=f"queueCitySitemapDelete{model.__name__}")
+
+
+# Таблица языковых версий сущностей
+ALTERNATES_ENTITY_TYPES = {model: entity_type for entity_type, model in ALTERNATE_ENTITIES.items()}
+ALTERNATES_TRANSLATION_TYPES = {
+    model._parler_meta.root_model: entity_type for entity_type, model in ALTERNATE_ENTITIES.items()
+}
+
+
+def update_entity_alternates(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    entity_type = ALTERNATES_TRANSLATION_TYPES[sender]
+    entity_id = instance.master_id
+    transaction.on_commit(lambda: refresh_alternates(entity_type, [entity_id]))
+
+
+def delete_entity_alternates(sender, instance, **kwargs):
+    entity_type = ALTERNATES_ENTITY_TYPES[sender]
+    entity_id = instance.pk
+    transaction.on_commit(lambda: delete_alternates(entity_type, [entity_id]))
+
+
+for model in ALTERNATES_TRANSLATION_TYPES:
+    post_save.connect(update_entity_alternates, sender=model, dispatch_uid=f"updateAlternates{model.__name__}")
+    post_delete.connect(update_entity_alternates, sender=model, dispatch_uid=f"updateAlternatesDelete{model.__name__}")
+
+for model in ALTERNATES_ENTITY_TYPES:
+    post_delete.connect(delete_entity_alternates, sender=model, dispatch_uid=f"deleteAlternates{model.__name__}")
+
+
+# Журнал изменений
+def log_change(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    record_changes([change_key(instance)])
+
+
+for model in TRACKED_MODELS:
+    post_save.connect(log_change, sender=model, dispatch_uid=f"logChange{model.__name__}")
+    post_delete.connect(log_change, sender=model, dispatch_uid=f"logChangeDelete{model.__name__}")
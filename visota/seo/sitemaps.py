@@ -0,0 +1,492 @@
+import hashlib
+import os
+import tempfile
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import date
+from itertools import groupby, islice
+from operator import itemgetter
+from xml.sax.saxutils import escape, quoteattr
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from apps.products import catalog_types
+from apps.products.models import Product, SubCategory, Tag
+from apps.blog.models import Post
+from .models import (
+    SEOStaticPage,
+    SEOProductPage,
+    SEOCategoryPage,
+    SEOTagPage,
+    SEOPostPage,
+    City,
+    CityProductSEO,
+    CityCategorySEO,
+    CityTagSEO,
+    CitySitemapRefresh,
+    SitemapShard,
+    EntityAlternates,
+)
+from .alternates import POST
+
+
+STATIC = "static"
+CITY = "city"
+
+SECTIONS = {
+    catalog_types.CATEGORY: (SubCategory, SEOCategoryPage),
+    catalog_types.TAG: (Tag, SEOTagPage),
+    catalog_types.PRODUCT: (Product, SEOProductPage),
+    POST: (Post, SEOPostPage),
+}
+
+CITY_SECTIONS = {
+    catalog_types.CATEGORY: CityCategorySEO,
+    catalog_types.TAG: CityTagSEO,
+    catalog_types.PRODUCT: CityProductSEO,
+}
+CITY_SITEMAP_REFRESH_CACHE_KEY = "seo:city-sitemap-refresh-scheduled"
+SITEMAP_LOCK_CACHE_KEY = "seo:sitemap-lock"
+
+XML_HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n'
+URLSET_OPEN = (
+    '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9" xmlns:xhtml="http://www.w3.org/1999/xhtml">\n'
+)
+URLSET_CLOSE = "</urlset>\n"
+
+
+def page_url(section, lang, slug):
+    path = settings.SITEMAP_PATHS[section].format(lang=lang, slug=slug).replace("//", "/")
+    return f"https://{settings.SITE_DOMAIN}{path}"
+
+
+def url_element(loc, lastmod=None, change_freq=None, priority=None, alternates=()):
+    parts = [f"<url><loc>{escape(loc)}</loc>"]
+    if lastmod:
+        parts.append(f"<lastmod>{lastmod.isoformat()}</lastmod>")
+    if change_freq:
+        parts.append(f"<changefreq>{change_freq}</changefreq>")
+    if priority is not None:
+        parts.append(f"<priority>{priority}</priority>")
+    for lang, href in alternates:
+        parts.append(f'<xhtml:link rel="alternate" hreflang="{lang}" href={quoteattr(href)}/>')
+    parts.append("</url>\n")
+    return "".join(parts)
+
+
+class SitemapsLocked(Exception):
+    pass
+
+
+@contextmanager
+def sitemap_lock():
+    """
+    Файлы sitemap и индекс пишет только один процесс: генерация и перегенерация городов
+    берут ключ в общем кэше на SITEMAP_LOCK_TIMEOUT секунд, занятый ключ - SitemapsLocked
+    """
+    cache = caches["shared"]
+    token = uuid.uuid4().hex
+    if not cache.add(SITEMAP_LOCK_CACHE_KEY, token, settings.SITEMAP_LOCK_TIMEOUT):
+        raise SitemapsLocked("Sitemap is being written by another process")
+    try:
+        yield
+    finally:
+        if cache.get(SITEMAP_LOCK_CACHE_KEY) == token:
+            cache.delete(SITEMAP_LOCK_CACHE_KEY)
+
+
+def open_temp(path):
+    """
+    Временный файл с уникальным именем рядом с path, (файл, путь)
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=f"{os.path.basename(path)}.", suffix=".tmp")
+    # mkstemp создает файл с правами 0600, а файлы sitemap отдает веб-сервер
+    os.chmod(tmp_path, 0o644)
+    return os.fdopen(fd, "w", encoding="utf-8"), tmp_path
+
+
+def write_atomic(path, chunks):
+    """
+    Файл пишется во временный и подменяется через os.replace, читатели не видят недописанный файл
+    """
+    f, tmp_path = open_temp(path)
+    try:
+        with f:
+            for chunk in chunks:
+                f.write(chunk)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+class ShardWriter:
+    """
+    Пишет url в файлы sitemap-{name}-{номер}.xml, не больше SITEMAP_MAX_URLS в каждом.
+    Для каждого файла запоминает количество url и время генерации.
+    """
+
+    def __init__(self, directory, name, number=1):
+        self.directory = directory
+        self.prefix = f"sitemap-{name}"
+        self.number = number
+        self.shards = {}
+        self._file = None
+        self._count = 0
+
+    def add(self, element):
+        if self._file is None or self._count >= settings.SITEMAP_MAX_URLS:
+            self._close_file()
+            self._open_file()
+        self._file.write(element)
+        self._count += 1
+
+    def close(self):
+        self._close_file()
+        return self.shards
+
+    def discard(self):
+        """
+        Удаляет недописанный файл после ошибки генерации
+        """
+        if self._file is not None:
+            self._file.close()
+            os.remove(self._tmp_path)
+            self._file = None
+
+    def _open_file(self):
+        self._name = shard_name(self.prefix, self.number + len(self.shards))
+        self._file, self._tmp_path = open_temp(os.path.join(self.directory, self._name))
+        self._file.write(XML_HEADER + URLSET_OPEN)
+        self._count = 0
+        self._started = time.monotonic()
+
+    def _close_file(self):
+        if self._file is None:
+            return
+        self._file.write(URLSET_CLOSE)
+        self._file.close()
+        os.replace(self._tmp_path, os.path.join(self.directory, self._name))
+        self.shards[self._name] = (self._count, time.monotonic() - self._started)
+        self._file = None
+
+
+def shard_name(prefix, number):
+    return f"{prefix}-{number}.xml"
+
+
+def static_rows(first_id=None, last_id=None):
+    qs = SEOStaticPage._parler_meta.root_model.objects.all()
+    if first_id is not None:
+        qs = qs.filter(master_id__gte=first_id, master_id__lte=last_id)
+    rows = qs.order_by("master_id", "language_code").values_list(
+        "master_id", "language_code", "priority", "change_freq"
+    )
+    for page, lang, priority, change_freq in rows.iterator(chunk_size=2000):
+        yield page, lang, page, None, priority, change_freq
+
+
+def entity_rows(section, first_id=None, last_id=None):
+    """
+    Slug и last_modified берутся из таблицы языковых версий, priority и change_freq
+    из переводов SEO страниц пачками по 2000 сущностей
+    """
+    SEOTranslation = SECTIONS[section][1]._parler_meta.root_model
+    qs = EntityAlternates.objects.filter(entity_type=section)
+    if first_id is not None:
+        qs = qs.filter(entity_id__gte=first_id, entity_id__lte=last_id)
+    rows = qs.order_by("entity_id").values_list("entity_id", "alternates").iterator(chunk_size=2000)
+
+    while chunk := list(islice(rows, 2000)):
+        seo = {
+            (master_id, lang): (priority, change_freq)
+            for master_id, lang, priority, change_freq in SEOTranslation.objects.filter(
+                master_id__in=[entity_id for entity_id, _ in chunk]
+            ).values_list("master_id", "language_code", "priority", "change_freq")
+        }
+        for entity_id, alternates in chunk:
+            for lang in sorted(alternates):
+                last_modified = alternates[lang]["last_modified"]
+                yield (
+                    entity_id,
+                    lang,
+                    alternates[lang]["slug"],
+                    date.fromisoformat(last_modified) if last_modified else None,
+                    *seo.get((entity_id, lang), (None, None)),
+                )
+
+
+def section_rows(section, first_id=None, last_id=None):
+    """
+    (id, язык, slug, last_modified, priority, change_freq) всех переводов раздела, отсортированные по id.
+    У статических страниц slug - ключ страницы, last_modified нет.
+    """
+    if section == STATIC:
+        return static_rows(first_id, last_id)
+    return entity_rows(section, first_id, last_id)
+
+
+def plan_section(section):
+    """
+    Раскладка переводов раздела по файлам без генерации xml: для каждого файла
+    диапазон id, количество url и контрольная сумма данных, от которых зависит его содержимое
+    (slug, last_modified, priority, change_freq и slug альтернативных языков).
+    """
+    plans = {}
+    counters = defaultdict(int)
+    for _, translations in groupby(section_rows(section), key=itemgetter(0)):
+        translations = list(translations)
+        data = repr(translations).encode()
+        for row in translations:
+            pk, lang = str(row[0]), row[1]
+            number = counters[lang] // settings.SITEMAP_MAX_URLS + 1
+            counters[lang] += 1
+            name = shard_name(f"sitemap-{section}-{lang}", number)
+            if name not in plans:
+                plans[name] = {
+                    "section": section,
+                    "lang": lang,
+                    "number": number,
+                    "first_id": pk,
+                    "url_count": 0,
+                    "checksum": hashlib.md5(),
+                }
+            plan = plans[name]
+            plan["last_id"] = pk
+            plan["url_count"] += 1
+            plan["checksum"].update(data)
+
+    for plan in plans.values():
+        plan["checksum"] = plan["checksum"].hexdigest()
+    return plans
+
+
+def write_planned_shard(directory, plan):
+    section, lang = plan["section"], plan["lang"]
+    writer = ShardWriter(directory, f"{section}-{lang}", number=plan["number"])
+    rows = section_rows(section, plan["first_id"], plan["last_id"])
+    try:
+        for _, translations in groupby(rows, key=itemgetter(0)):
+            translations = list(translations)
+            alternates = [(row[1], page_url(section, row[1], row[2])) for row in translations]
+            for _, row_lang, slug, last_modified, priority, change_freq in translations:
+                if row_lang == lang:
+                    writer.add(
+                        url_element(page_url(section, lang, slug), last_modified, change_freq, priority, alternates)
+                    )
+    except BaseException:
+        writer.discard()
+        raise
+    return writer.close()
+
+
+# City
+def _city_entity_value(EntityModel, field, lang):
+    EntityTranslation = EntityModel._parler_meta.root_model
+    return Subquery(
+        EntityTranslation.objects.filter(master_id=OuterRef("entity_id"), language_code=lang).values(field)[:1]
+    )
+
+
+def city_rows(section, city):
+    """
+    (slug, last_modified) сущностей раздела, привязанных к городу, на языке города
+    с fallback на основной язык
+    """
+    CitySEOModel = CITY_SECTIONS[section]
+    EntityModel = CitySEOModel.entity.field.related_model
+    annotations = {
+        field: Coalesce(
+            _city_entity_value(EntityModel, field, city.lang),
+            _city_entity_value(EntityModel, field, settings.LANGUAGE_CODE),
+        )
+        for field in ("slug", "last_modified")
+    }
+    return (
+        CitySEOModel.objects.filter(city=city)
+        .order_by("entity_id")
+        .annotate(entity_slug=annotations["slug"], entity_last_modified=annotations["last_modified"])
+        .values_list("entity_slug", "entity_last_modified")
+        .iterator(chunk_size=2000)
+    )
+
+
+def city_url(section, city, slug):
+    path = settings.SITEMAP_CITY_PATHS[section].format(lang=city.lang, city=city.slug, slug=slug)
+    return f"https://{settings.SITE_DOMAIN}{path}"
+
+
+def write_city_section(directory, city):
+    """
+    Все страницы города в файлах sitemap-city-{id города}-{номер}.xml
+    """
+    writer = ShardWriter(directory, f"{CITY}-{city.pk}")
+    try:
+        for section in CITY_SECTIONS:
+            for slug, last_modified in city_rows(section, city):
+                if slug:
+                    writer.add(url_element(city_url(section, city, slug), last_modified))
+    except BaseException:
+        writer.discard()
+        raise
+    return writer.close()
+
+
+def save_shards(written, section, lang, checksums=None):
+    now = timezone.now()
+    for name, (url_count, build_time) in written.items():
+        SitemapShard.objects.update_or_create(
+            name=name,
+            defaults={
+                "section": section,
+                "lang": lang,
+                "url_count": url_count,
+                "checksum": (checksums or {}).get(name, ""),
+                "built_at": now,
+                "build_time": build_time,
+            },
+        )
+
+
+def sitemap_index(shards):
+    yield XML_HEADER
+    yield '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+    for name, built_at in shards:
+        loc = escape(f"https://{settings.SITE_DOMAIN}{settings.SITEMAP_PATH}{name}")
+        yield f"<sitemap><loc>{loc}</loc><lastmod>{built_at.date().isoformat()}</lastmod></sitemap>\n"
+    yield "</sitemapindex>\n"
+
+
+def replace_index(directory, stale):
+    """
+    Индекс подменяется после записи файлов, файлы, которых в нем больше нет, удаляются после индекса
+    """
+    shards = SitemapShard.objects.exclude(name__in=stale).order_by("name").values_list("name", "built_at")
+    write_atomic(os.path.join(directory, "sitemap.xml"), sitemap_index(shards))
+    SitemapShard.objects.filter(name__in=stale).delete()
+    for name in stale:
+        path = os.path.join(directory, name)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def build_sitemaps(full=False):
+    """
+    Генерация sitemap в SITEMAP_ROOT. Перегенерируются только файлы, у которых изменилась
+    контрольная сумма данных, с full=True - все файлы, включая файлы городов.
+    Без full файлы городов пишутся только для городов, у которых их еще нет.
+    Возвращает {файл: количество url} перегенерированных файлов.
+    Если sitemap уже пишет другой процесс - SitemapsLocked.
+    """
+    with sitemap_lock():
+        return _build_sitemaps(full)
+
+
+def _build_sitemaps(full):
+    directory = settings.SITEMAP_ROOT
+    os.makedirs(directory, exist_ok=True)
+    checksums = dict(SitemapShard.objects.values_list("name", "checksum"))
+
+    plans = {}
+    for section in (STATIC, *SECTIONS):
+        plans.update(plan_section(section))
+
+    built = {}
+    for name, plan in plans.items():
+        if not full and checksums.get(name) == plan["checksum"] and os.path.exists(os.path.join(directory, name)):
+            continue
+        written = write_planned_shard(directory, plan)
+        save_shards(written, plan["section"], plan["lang"], {name: plan["checksum"]})
+        built.update(written)
+
+    city_shards = set()
+    if full:
+        for city in City.objects.only("pk", "slug", "lang").iterator():
+            written = write_city_section(directory, city)
+            save_shards(written, CITY, city.lang)
+            built.update(written)
+        city_shards = built.keys()
+    else:
+        city_shards = {name for name in checksums if name.startswith(f"sitemap-{CITY}-")}
+        # файлы городов обновляет очередь refresh_queued_city_sitemaps, здесь пишутся только
+        # файлы городов, у которых их еще нет (новый город или первая генерация без full)
+        cities_with_shards = {int(name.split("-")[2]) for name in city_shards}
+        for city in City.objects.exclude(pk__in=cities_with_shards).only("pk", "slug", "lang").iterator():
+            written = write_city_section(directory, city)
+            save_shards(written, CITY, city.lang)
+            built.update(written)
+            city_shards |= written.keys()
+
+    stale = checksums.keys() - plans.keys() - city_shards
+    if built or stale or not os.path.exists(os.path.join(directory, "sitemap.xml")):
+        replace_index(directory, stale)
+    return {name: url_count for name, (url_count, _) in built.items()}
+
+
+def rebuild_city_sitemaps(city_ids):
+    """
+    Перегенерация файлов только указанных городов, файлы удаленных городов удаляются.
+    Если sitemap уже пишет другой процесс - SitemapsLocked.
+    """
+    with sitemap_lock():
+        return _rebuild_city_sitemaps(city_ids)
+
+
+def _rebuild_city_sitemaps(city_ids):
+    directory = settings.SITEMAP_ROOT
+    os.makedirs(directory, exist_ok=True)
+
+    built = {}
+    for city in City.objects.filter(pk__in=city_ids).only("pk", "slug", "lang"):
+        written = write_city_section(directory, city)
+        save_shards(written, CITY, city.lang)
+        built.update(written)
+
+    prefixes = tuple(f"sitemap-{CITY}-{pk}-" for pk in city_ids)
+    existing = SitemapShard.objects.filter(section=CITY).values_list("name", flat=True)
+    stale = {name for name in existing if name.startswith(prefixes) and name not in built}
+    replace_index(directory, stale)
+    return {name: url_count for name, (url_count, _) in built.items()}
+
+
+def queue_city_sitemap_refresh(city_ids):
+    """
+    Ставит города в очередь на перегенерацию sitemap.
+    Задача celery запускается не чаще одного раза за SITEMAP_CITY_REFRESH_DELAY секунд (ключ в общем кэше).
+    Повторная постановка уже стоящего в очереди города обновляет queued_at.
+    """
+    CitySitemapRefresh.objects.bulk_create(
+        [CitySitemapRefresh(city_id=pk) for pk in city_ids],
+        update_conflicts=True,
+        unique_fields=("city_id",),
+        update_fields=("queued_at",),
+    )
+    if caches["shared"].add(CITY_SITEMAP_REFRESH_CACHE_KEY, True, settings.SITEMAP_CITY_REFRESH_DELAY):
+        from .tasks import refresh_queued_city_sitemaps_task
+
+        refresh_queued_city_sitemaps_task.apply_async(countdown=settings.SITEMAP_CITY_REFRESH_DELAY)
+
+
+def queue_entity_city_sitemap_refresh(entity_type, ids):
+    CitySEOModel = CITY_SECTIONS[entity_type]
+    city_ids = set(CitySEOModel.objects.filter(entity_id__in=ids).values_list("city_id", flat=True))
+    if city_ids:
+        queue_city_sitemap_refresh(city_ids)
+
+
+def refresh_queued_city_sitemaps():
+    """
+    Города удаляются из очереди после перегенерации, кроме поставленных заново во время нее.
+    При SitemapsLocked очередь остается как есть.
+    """
+    started_at = timezone.now()
+    city_ids = list(CitySitemapRefresh.objects.values_list("city_id", flat=True))
+    if not city_ids:
+        return {}
+    result = rebuild_city_sitemaps(city_ids)
+    CitySitemapRefresh.objects.filter(city_id__in=city_ids, queued_at__lte=started_at).delete()
+    return result
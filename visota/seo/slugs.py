@@ -0,0 +1,97 @@
+import base64
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.conf import settings
+from .alternates import ALTERNATE_ENTITIES
+from .sitemaps import CITY_SECTIONS
+
+CITY_SLUG_TYPES = {f"city-{entity_type}": CitySEOModel for entity_type, CitySEOModel in CITY_SECTIONS.items()}
+SLUG_TYPES = [*ALTERNATE_ENTITIES, *CITY_SLUG_TYPES]
+
+
+def encode_cursor(entity_type, last_id):
+    return base64.urlsafe_b64encode(f"{entity_type}:{last_id}".encode()).decode()
+
+
+def decode_cursor(cursor):
+    """
+    (тип, id последней отданной строки), ValueError при некорректном курсоре
+    """
+    try:
+        entity_type, last_id = base64.urlsafe_b64decode(cursor.encode()).decode().split(":")
+        last_id = int(last_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Некорректный курсор")
+    if entity_type not in SLUG_TYPES:
+        raise ValueError("Некорректный курсор")
+    return entity_type, last_id
+
+
+def _city_entity_value(EntityModel, field, lang):
+    EntityTranslation = EntityModel._parler_meta.root_model
+    return Subquery(
+        EntityTranslation.objects.filter(master_id=OuterRef("entity_id"), language_code=lang).values(field)[:1]
+    )
+
+
+def slug_rows(entity_type, after_id, lang, limit):
+    """
+    (id строки, язык, slug, last_modified) из таблицы переводов, у страниц городов slug - "город/slug сущности"
+    """
+    if entity_type in ALTERNATE_ENTITIES:
+        qs = ALTERNATE_ENTITIES[entity_type]._parler_meta.root_model.objects.filter(id__gt=after_id)
+        if lang:
+            qs = qs.filter(language_code=lang)
+        return list(qs.order_by("id").values_list("id", "language_code", "slug", "last_modified")[:limit])
+
+    qs = city_slug_queryset(entity_type).filter(id__gt=after_id)
+    if lang:
+        qs = qs.filter(city__lang=lang)
+    return city_slug_rows(qs.order_by("id")[:limit])
+
+
+def city_slug_queryset(entity_type):
+    CitySEOModel = CITY_SLUG_TYPES[entity_type]
+    EntityModel = CitySEOModel.entity.field.related_model
+    return CitySEOModel.objects.annotate(
+        **{
+            f"entity_{field}": Coalesce(
+                _city_entity_value(EntityModel, field, OuterRef("city__lang")),
+                _city_entity_value(EntityModel, field, settings.LANGUAGE_CODE),
+            )
+            for field in ("slug", "last_modified")
+        }
+    )
+
+
+def city_slug_rows(qs):
+    rows = qs.values_list("id", "city__lang", "city__slug", "entity_slug", "entity_last_modified")
+    return [
+        (pk, city_lang, f"{city_slug}/{slug}", last_modified) for pk, city_lang, city_slug, slug, last_modified in rows
+    ]
+
+
+def enumerate_slugs(cursor=None, limit=None, lang=None, types=None):
+    """
+    Страница кортежей (тип, язык, slug, last_modified) по всем типам страниц подряд
+    и курсор следующей страницы (None на последней)
+    """
+    limit = limit or settings.SEO_SLUGS_PAGE_SIZE
+    types = [entity_type for entity_type in SLUG_TYPES if not types or entity_type in types]
+    if not types:
+        return [], None
+
+    start_type, after_id = types[0], 0
+    if cursor:
+        start_type, after_id = decode_cursor(cursor)
+        if start_type not in types:
+            raise ValueError("Курсор не соответствует фильтру типов")
+
+    results = []
+    for entity_type in types[types.index(start_type) :]:
+        rows = slug_rows(entity_type, after_id, lang, limit - len(results))
+        results.extend((entity_type, row_lang, slug, last_modified) for _, row_lang, slug, last_modified in rows)
+        if len(results) >= limit:
+            return results, encode_cursor(entity_type, rows[-1][0])
+        after_id = 0
+    return results, None
@@ -0,0 +1,53 @@
+from django.conf import settings
+from visota.celery import app
+from .metadata import regenerate_metadata, regenerate_city_metadata, refresh_queued_city_metadata
+from .changes import prune_change_log
+from .sitemaps import build_sitemaps, refresh_queued_city_sitemaps, SitemapsLocked
+from .webhooks import dispatch_webhooks, WebhookDeliveryError
+
+
+@app.task
+def regenerate_metadata_task(entity_type, ids):
+    return regenerate_metadata(entity_type, ids)
+
+
+@app.task
+def regenerate_city_metadata_task(entity_type, ids):
+    return regenerate_city_metadata(entity_type, ids)
+
+
+@app.task
+def refresh_queued_city_metadata_task():
+    return refresh_queued_city_metadata()
+
+
+@app.task(bind=True, max_retries=settings.SITEMAP_LOCK_MAX_RETRIES)
+def build_sitemaps_task(self, full=False):
+    try:
+        return build_sitemaps(full=full)
+    except SitemapsLocked as e:
+        if not full:
+            # изменения подхватит следующий запуск по расписанию
+            return None
+        raise self.retry(exc=e, countdown=settings.SITEMAP_CITY_REFRESH_DELAY)
+
+
+@app.task(bind=True, max_retries=settings.SITEMAP_LOCK_MAX_RETRIES)
+def refresh_queued_city_sitemaps_task(self):
+    try:
+        return refresh_queued_city_sitemaps()
+    except SitemapsLocked as e:
+        raise self.retry(exc=e, countdown=settings.SITEMAP_CITY_REFRESH_DELAY)
+
+
+@app.task
+def prune_change_log_task():
+    return prune_change_log()
+
+
+@app.task(bind=True, max_retries=settings.SEO_WEBHOOK_MAX_RETRIES)
+def dispatch_webhooks_task(self):
+    try:
+        return dispatch_webhooks()
+    except WebhookDeliveryError as e:
+        raise self.retry(exc=e, countdown=settings.SEO_WEBHOOK_DELAY * 2**self.request.retries)
@@ -1,3 +1,126 @@
-from django.test import TestCase
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from django.conf import settings
+from django.test import TestCase, override_settings
+from apps.products import catalog_types
+from .models import WebhookOutbox
+from .tasks import dispatch_webhooks_task
+from . import webhooks
 
-# Create your tests here.
+
+class StubWebhookServer(ThreadingHTTPServer):
+    """
+    Локальный фронтенд: отвечает статусами из statuses по очереди (дальше 200), запоминает тела запросов
+    """
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StubWebhookHandler)
+        self.statuses = []
+        self.requests = []
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_port}/revalidate"
+
+
+class StubWebhookHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self.server.requests.append({"headers": dict(self.headers), "body": json.loads(body)})
+        status = self.server.statuses.pop(0) if self.server.statuses else 200
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class DispatchWebhooksTaskTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = StubWebhookServer()
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.server.statuses = []
+        self.server.requests = []
+        settings_override = override_settings(
+            SEO_WEBHOOK_URL=self.server.url, SEO_WEBHOOK_SECRET="secret", SEO_WEBHOOK_TIMEOUT=2
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        WebhookOutbox.objects.bulk_create(
+            [WebhookOutbox(entity_type=catalog_types.PRODUCT, entity_id=pk, lang="") for pk in (1, 2)]
+        )
+
+    def dispatch(self):
+        countdowns = []
+        signature_from_request = dispatch_webhooks_task.signature_from_request
+
+        def record_countdown(*args, **kwargs):
+            countdowns.append(kwargs["countdown"])
+            return signature_from_request(*args, **kwargs)
+
+        with mock.patch.object(dispatch_webhooks_task, "signature_from_request", side_effect=record_countdown):
+            result = dispatch_webhooks_task.apply()
+        return result, countdowns
+
+    def test_delivers_outbox_in_one_request(self):
+        result, countdowns = self.dispatch()
+
+        self.assertTrue(result.successful())
+        self.assertEqual(result.result, 2)
+        self.assertEqual(countdowns, [])
+        self.assertEqual(len(self.server.requests), 1)
+        request = self.server.requests[0]
+        self.assertEqual(request["headers"]["Authorization"], "Bearer secret")
+        self.assertEqual(
+            sorted((change["type"], change["id"]) for change in request["body"]["changes"]),
+            [(catalog_types.PRODUCT, 1), (catalog_types.PRODUCT, 2)],
+        )
+        self.assertFalse(WebhookOutbox.objects.exists())
+
+    def test_retries_with_exponential_backoff(self):
+        self.server.statuses = [500, 503, 502]
+
+        result, countdowns = self.dispatch()
+
+        self.assertTrue(result.successful())
+        delay = settings.SEO_WEBHOOK_DELAY
+        self.assertEqual(countdowns, [delay, delay * 2, delay * 4])
+        self.assertEqual(len(self.server.requests), 4)
+        self.assertFalse(WebhookOutbox.objects.exists())
+
+    def test_keeps_outbox_after_last_retry(self):
+        self.server.statuses = [500] * (dispatch_webhooks_task.max_retries + 1)
+
+        result, countdowns = self.dispatch()
+
+        self.assertTrue(result.failed())
+        self.assertIsInstance(result.result, webhooks.WebhookDeliveryError)
+        self.assertEqual(len(countdowns), dispatch_webhooks_task.max_retries + 1)
+        self.assertEqual(len(self.server.requests), dispatch_webhooks_task.max_retries + 1)
+        self.assertEqual(WebhookOutbox.objects.count(), 2)
+
+    def test_keeps_keys_queued_again_during_send(self):
+        send_webhook = webhooks.send_webhook
+
+        def send_and_change(changes):
+            send_webhook(changes)
+            webhooks.queue_webhook_events([(catalog_types.PRODUCT, 2, "")])
+
+        with mock.patch.object(webhooks, "send_webhook", side_effect=send_and_change):
+            delivered = webhooks.dispatch_webhooks()
+
+        self.assertEqual(delivered, 2)
+        self.assertEqual(list(WebhookOutbox.objects.values_list("entity_id", flat=True)), [2])
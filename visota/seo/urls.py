@@ -15,4 +15,22 @@ router.register("city-seo/categories", CityCategorySEOApi)
 router.register("city-seo/products", CityProductSEOApi)
 router.register("city-seo/tags", CityTagSEOApi)
 
-urlpatterns = [path("meta/", include(router.urls)), path("redirects/", RedirectApi.as_view())]
+page_router = routers.SimpleRouter(trailing_slash=True)
+page_router.register("product", ProductPageDataApi)
+page_router.register("category", CategoryPageDataApi)
+page_router.register("tag", TagPageDataApi)
+page_router.register("blog", PostPageDataApi)
+
+city_page_router = routers.SimpleRouter(trailing_slash=True)
+city_page_router.register("product", CityProductPageDataApi)
+city_page_router.register("category", CityCategoryPageDataApi)
+city_page_router.register("tag", CityTagPageDataApi)
+
+urlpatterns = [
+    path("meta/", include(router.urls)),
+    path("page/", include(page_router.urls)),
+    path("page/city/<slug:city_slug>/", include(city_page_router.urls)),
+    path("slugs/", SlugsApi.as_view()),
+    path("changes/", ChangesApi.as_view()),
+    path("redirects/", RedirectApi.as_view()),
+]
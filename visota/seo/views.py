@@ -1,8 +1,13 @@
-from django.shortcuts import render, HttpResponse, get_object_or_404
+from django.shortcuts import render, HttpResponse, get_object_or_404, redirect
+from django.conf import settings
+from django.db.models import F, Prefetch
 from django.http import Http404
+from django.utils.cache import patch_cache_control
+from django.views.decorators.cache import cache_control
 from django.utils.translation import get_language
 from rest_framework import viewsets, mixins, views
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 from .models import *
 from .serializers import (
     SEOStaticPageSerializer,
@@ -16,14 +21,28 @@ from .serializers import (
     CityProductSEOSerializer,
     CityTagSEOSerializer,
 )
+from apps.products import catalog_types
 from apps.products.models import ProductRedirectFrom, CategoryRedirectFrom, TagRedirectFrom
+from apps.products.serializers import (
+    ProductItemSerializer,
+    CategoryItemSerializer,
+    TagItemSerializer,
+    CityProductSerializer,
+    CityCategorySerializer,
+    CityTagSerializer,
+)
 from apps.blog.models import PostRedirectFrom
+from apps.blog.serializers import ArticleSerializer
+from .alternates import POST, get_alternates
+from .slugs import enumerate_slugs
+from .changes import changes_since
+from .cache import robots_cache, static_pages_cache
 
 
 # Create your views here.
+@cache_control(public=True, max_age=settings.SEO_CACHE_MAX_AGE)
 def robots(req):
-    robots = Robots.objects.all()[0]
-    return HttpResponse(robots.text, content_type="text/plain")
+    return HttpResponse(robots_cache.get_data(), content_type="text/plain")
 
 
 class MetaStaticApi(viewsets.GenericViewSet, mixins.RetrieveModelMixin):
@@ -31,6 +50,18 @@ class MetaStaticApi(viewsets.GenericViewSet, mixins.RetrieveModelMixin):
     serializer_class = SEOStaticPageSerializer
     lookup_field = "page"
 
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Ответ из static_pages_cache, без запросов к базе; 404, если у страницы нет перевода
+        на текущий язык.
+        """
+        page = static_pages_cache.get_data().get(self.kwargs[self.lookup_field], {})
+        if get_language() not in page:
+            raise Http404
+        response = Response(page[get_language()])
+        patch_cache_control(response, public=True, max_age=settings.SEO_CACHE_MAX_AGE)
+        return response
+
 
 class MetaCategoryApi(viewsets.GenericViewSet, mixins.RetrieveModelMixin):
     queryset = SEOCategoryPage.objects.all()
@@ -117,6 +148,44 @@ class RedirectApi(views.APIView):
         return Response(redirect_serializer.data)
 
 
+class SlugsApi(views.APIView):
+    """
+    Slug всех страниц для статической генерации фронтенда, постранично по курсору.
+    Параметры: cursor, limit, lang, type (можно несколько).
+    """
+
+    def get(self, request):
+        params = request.query_params
+        try:
+            limit = min(int(params.get("limit") or settings.SEO_SLUGS_PAGE_SIZE), settings.SEO_SLUGS_MAX_PAGE_SIZE)
+            rows, cursor = enumerate_slugs(
+                cursor=params.get("cursor"),
+                limit=max(limit, 1),
+                lang=params.get("lang"),
+                types=params.getlist("type"),
+            )
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=400)
+
+        next_url = None
+        if cursor:
+            next_url = replace_query_param(request.build_absolute_uri(), "cursor", cursor)
+        return Response({"next": next_url, "results": rows})
+
+
+class ChangesApi(views.APIView):
+    """
+    Изменения страниц после курсора since, без повторов
+    """
+
+    def get(self, request):
+        since = request.query_params.get("since") or "0"
+        if not since.isdigit():
+            return Response({"detail": "Некорректный курсор"}, status=400)
+        changes, cursor, more = changes_since(int(since))
+        return Response({"cursor": str(cursor), "more": more, "changes": changes})
+
+
 class CitySEOApi(viewsets.GenericViewSet, mixins.RetrieveModelMixin):
     lookup_url_kwarg = "ids"
 
@@ -138,3 +207,174 @@ class CityProductSEOApi(CitySEOApi):
 class CityTagSEOApi(CitySEOApi):
     queryset = CityTagSEO.objects.all()
     serializer_class = CityTagSEOSerializer
+
+
+# page data
+def category_breadcrumbs(category):
+    group = category.category
+    return [
+        {"type": "group", "name": group.safe_translation_getter("name", any_language=True), "slug": group.slug},
+        {"type": catalog_types.CATEGORY, "name": category.name, "slug": category.slug},
+    ]
+
+
+def product_breadcrumbs(product):
+    lang = get_language()
+    for category in product.sub_categories.all():
+        if category.has_translation(lang):
+            return category_breadcrumbs(category)
+    return []
+
+
+def group_breadcrumbs(category):
+    return category_breadcrumbs(category)[:1]
+
+
+class PageDataApi(viewsets.GenericViewSet, mixins.RetrieveModelMixin):
+    """
+    Сущность, метатеги, языковые версии и хлебные крошки страницы одним ответом.
+    Метатеги берутся из поля seo сериализатора сущности, SEO страница сериализуется один раз.
+    """
+
+    entity_type = None
+    redirect_class = None
+    lookup_url_kwarg = "slug"
+
+    def get_object(self):
+        return get_object_or_404(
+            self.get_queryset(), translations__slug=self.kwargs["slug"], translations__language_code=get_language()
+        )
+
+    def get_entity(self, instance):
+        return instance
+
+    def get_breadcrumbs(self, entity):
+        return []
+
+    def retrieve(self, request, slug=None, *args, **kwargs):
+        try:
+            instance = self.get_object()
+        except Http404:
+            active_slug = get_object_or_404(self.redirect_class, lang=get_language(), old_slug=slug)
+            return redirect(f"/{active_slug.to.slug}/", permanent=True)
+
+        entity = self.get_entity(instance)
+        data = dict(self.get_serializer(instance).data)
+        meta = data.pop("seo")
+        return Response(
+            {
+                "entity": data,
+                "meta": meta,
+                "alternates": get_alternates(self.entity_type, entity.pk),
+                "breadcrumbs": self.get_breadcrumbs(entity),
+            }
+        )
+
+
+PRODUCT_CATEGORIES = Prefetch(
+    "sub_categories",
+    queryset=SubCategory.objects.order_by("priority").select_related("category").prefetch_related("translations"),
+)
+
+
+class ProductPageDataApi(PageDataApi):
+    entity_type = catalog_types.PRODUCT
+    queryset = Product.objects.select_related("seo").prefetch_related(
+        "translations",
+        "seo__translations",
+        "img_urls",
+        "productcharacteristic_set__characteristic__translations",
+        "productcharacteristic_set__characteristic_value__translations",
+        PRODUCT_CATEGORIES,
+    )
+    serializer_class = ProductItemSerializer
+    redirect_class = ProductRedirectFrom
+
+    def retrieve(self, request, slug=None, *args, **kwargs):
+        response = super().retrieve(request, slug, *args, **kwargs)
+        if response.status_code == 200:
+            Product.objects.filter(pk=response.data["entity"]["id"]).update(views=F("views") + 1)
+        return response
+
+    def get_breadcrumbs(self, entity):
+        return product_breadcrumbs(entity)
+
+
+class CategoryPageDataApi(PageDataApi):
+    entity_type = catalog_types.CATEGORY
+    queryset = SubCategory.objects.select_related("seo", "category").prefetch_related(
+        "translations", "seo__translations"
+    )
+    serializer_class = CategoryItemSerializer
+    redirect_class = CategoryRedirectFrom
+
+    def get_breadcrumbs(self, entity):
+        return group_breadcrumbs(entity)
+
+
+class TagPageDataApi(PageDataApi):
+    entity_type = catalog_types.TAG
+    queryset = Tag.objects.select_related("seo").prefetch_related("translations", "seo__translations")
+    serializer_class = TagItemSerializer
+    redirect_class = TagRedirectFrom
+
+
+class PostPageDataApi(PageDataApi):
+    entity_type = POST
+    queryset = Post.objects.select_related("seo").prefetch_related("translations", "seo__translations")
+    serializer_class = ArticleSerializer
+    redirect_class = PostRedirectFrom
+
+
+class CityPageDataApi(PageDataApi):
+    def get_object(self):
+        lang = get_language()
+        return get_object_or_404(
+            self.get_queryset().select_related("city", "entity__seo"),
+            entity__translations__slug=self.kwargs["slug"],
+            entity__translations__language_code=lang,
+            city__slug=self.kwargs["city_slug"],
+            city__lang=lang,
+        )
+
+    def get_entity(self, instance):
+        return instance.entity
+
+    def retrieve(self, request, city_slug=None, slug=None, *args, **kwargs):
+        return super().retrieve(request, slug, *args, **kwargs)
+
+
+class CityProductPageDataApi(CityPageDataApi):
+    entity_type = catalog_types.PRODUCT
+    queryset = CityProductSEO.objects.prefetch_related(
+        "entity__translations",
+        "entity__seo__translations",
+        "entity__img_urls",
+        "entity__productcharacteristic_set__characteristic__translations",
+        "entity__productcharacteristic_set__characteristic_value__translations",
+        Prefetch("entity__sub_categories", queryset=PRODUCT_CATEGORIES.queryset),
+    )
+    serializer_class = CityProductSerializer
+    redirect_class = ProductRedirectFrom
+
+    def get_breadcrumbs(self, entity):
+        return product_breadcrumbs(entity)
+
+
+class CityCategoryPageDataApi(CityPageDataApi):
+    entity_type = catalog_types.CATEGORY
+    queryset = CityCategorySEO.objects.select_related("entity__category").prefetch_related(
+        "entity__translations", "entity__seo__translations"
+    )
+    serializer_class = CityCategorySerializer
+    redirect_class = CategoryRedirectFrom
+
+    def get_breadcrumbs(self, entity):
+        return group_breadcrumbs(entity)
+
+
+class CityTagPageDataApi(CityPageDataApi):
+    entity_type = catalog_types.TAG
+    queryset = CityTagSEO.objects.prefetch_related("entity__translations", "entity__seo__translations")
+    serializer_class = CityTagSerializer
+    redirect_class = TagRedirectFrom
@@ -0,0 +1,76 @@
+import requests
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+from .models import WebhookOutbox
+from .changes import resolve_changes
+
+WEBHOOK_SCHEDULED_CACHE_KEY = "seo:webhook-scheduled"
+
+
+class WebhookDeliveryError(Exception):
+    pass
+
+
+def queue_webhook_events(keys):
+    """
+    Ставит ключи изменений в outbox. Отправка запускается не чаще одного раза за SEO_WEBHOOK_DELAY секунд,
+    изменения одной сущности за это время уходят одним событием. Повторное изменение ключа, который уже в outbox,
+    обновляет queued_at: если ключ в этот момент отправляется, строка не будет удалена после отправки.
+    """
+    WebhookOutbox.objects.bulk_create(
+        [WebhookOutbox(entity_type=entity_type, entity_id=pk, lang=lang) for entity_type, pk, lang in keys],
+        update_conflicts=True,
+        unique_fields=("entity_type", "entity_id", "lang"),
+        update_fields=("queued_at",),
+    )
+    transaction.on_commit(schedule_webhook_dispatch)
+
+
+def schedule_webhook_dispatch(countdown=None):
+    if caches["shared"].add(WEBHOOK_SCHEDULED_CACHE_KEY, True, settings.SEO_WEBHOOK_DELAY):
+        from .tasks import dispatch_webhooks_task
+
+        dispatch_webhooks_task.apply_async(countdown=settings.SEO_WEBHOOK_DELAY if countdown is None else countdown)
+
+
+def send_webhook(changes):
+    headers = {}
+    if settings.SEO_WEBHOOK_SECRET:
+        headers["Authorization"] = f"Bearer {settings.SEO_WEBHOOK_SECRET}"
+    try:
+        response = requests.post(
+            settings.SEO_WEBHOOK_URL,
+            json={"changes": changes},
+            headers=headers,
+            timeout=settings.SEO_WEBHOOK_TIMEOUT,
+        )
+    except requests.RequestException as e:
+        raise WebhookDeliveryError(str(e)) from e
+    if response.status_code >= 300:
+        raise WebhookDeliveryError(f"webhook ответил {response.status_code}")
+
+
+def dispatch_webhooks():
+    """
+    Отправка outbox пачками по SEO_WEBHOOK_BATCH_SIZE ключей.
+    Строки удаляются только после успешной доставки, при ошибке остаются для повторной попытки.
+    Ключи, поставленные заново во время отправки (queued_at позже ее начала), остаются до следующего запуска.
+    Возвращает количество доставленных ключей.
+    """
+    if not settings.SEO_WEBHOOK_URL:
+        return 0
+
+    delivered = 0
+    last_id = 0
+    while True:
+        started_at = timezone.now()
+        outbox = WebhookOutbox.objects.filter(id__gt=last_id).order_by("id")
+        batch = list(outbox.values_list("id", "entity_type", "entity_id", "lang")[: settings.SEO_WEBHOOK_BATCH_SIZE])
+        if not batch:
+            return delivered
+        last_id = batch[-1][0]
+        send_webhook(resolve_changes(row[1:] for row in batch))
+        WebhookOutbox.objects.filter(id__in=[row[0] for row in batch], queued_at__lte=started_at).delete()
+        delivered += len(batch)
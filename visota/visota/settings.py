@@ -60,6 +60,7 @@ CORS_ALLOW_HEADERS = [
     "user-agent",
     "x-csrftoken",
     "x-requested-with",
+    "idempotency-key",
 ]
 
 
@@ -94,6 +95,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "debug_toolbar.middleware.DebugToolbarMiddleware",
+    "common.log.CorrelationIdMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.locale.LocaleMiddleware",
@@ -445,6 +447,89 @@ CELERY_ACCEPT_CONTENT = ["application/json"]
 CELERY_TASK_SERIALIZER = "json"
 CELERY_RESULT_SERIALIZER = "json"
 
+CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    # общий для всех процессов кэш: ключи идемпотентности, счетчики ограничения заявок,
+    # отложенный запуск задач очередей и версии кэшей SEO в памяти процессов
+    "shared": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": "redis://" + REDIS_HOST + ":" + REDIS_PORT + "/1",
+    },
+}
+
+
+# SEO
+# выборки больше этого размера генерируются в celery
+SEO_METADATA_ASYNC_THRESHOLD = 500
+# задержка (сек) перед обновлением SEO по городам после изменения цены или названия
+SEO_CITY_REFRESH_DELAY = 60
+# как часто (сек) процесс сверяет версию закэшированных robots.txt, SEO статических страниц и правил генерации
+SEO_CACHE_RECHECK_INTERVAL = 5
+# Cache-Control max-age (сек) для robots.txt и метатегов статических страниц
+SEO_CACHE_MAX_AGE = 10 * 60
+# размер страницы перечисления slug для статической генерации
+SEO_SLUGS_PAGE_SIZE = 1000
+SEO_SLUGS_MAX_PAGE_SIZE = 10000
+# журнал изменений: записей на страницу и сколько дней хранить
+SEO_CHANGES_PAGE_SIZE = 1000
+SEO_CHANGES_RETENTION_DAYS = 30
+# вебхук фронтенда для сброса кэша и ревалидации страниц, без адреса не отправляется
+SEO_WEBHOOK_URL = os.getenv("SEO_WEBHOOK_URL")
+SEO_WEBHOOK_SECRET = os.getenv("SEO_WEBHOOK_SECRET")
+# изменения за это время (сек) уходят одним запросом
+SEO_WEBHOOK_DELAY = 5
+SEO_WEBHOOK_BATCH_SIZE = 500
+SEO_WEBHOOK_TIMEOUT = 10
+# повторы при недоступности фронтенда, пауза растет экспоненциально от SEO_WEBHOOK_DELAY
+SEO_WEBHOOK_MAX_RETRIES = 8
+# sitemap пишется файлами в media и отдается веб-сервером как статика
+SITEMAP_ROOT = os.path.join(MEDIA_ROOT, "sitemap")
+SITEMAP_PATH = "/media/sitemap/"
+# не больше 50000 url в одном файле sitemap
+SITEMAP_MAX_URLS = 50000
+# пути страниц фронтенда по разделам
+SITEMAP_PATHS = {
+    "static": "/{lang}/{slug}/",
+    "category": "/{lang}/catalog/{slug}/",
+    "tag": "/{lang}/catalog/tags/{slug}/",
+    "product": "/{lang}/catalog/products/{slug}/",
+    "post": "/{lang}/articles/{slug}/",
+}
+SITEMAP_CITY_PATHS = {
+    "category": "/{lang}/{city}/catalog/{slug}/",
+    "tag": "/{lang}/{city}/catalog/tags/{slug}/",
+    "product": "/{lang}/{city}/catalog/products/{slug}/",
+}
+# задержка (сек) перед перегенерацией sitemap городов после изменений
+SITEMAP_CITY_REFRESH_DELAY = 60
+# как часто (сек) celery beat перегенерирует измененные файлы sitemap
+SITEMAP_UPDATE_INTERVAL = 15 * 60
+# на сколько (сек) генерация sitemap занимает файлы; задача, заставшая их занятыми, повторяется
+# через SITEMAP_CITY_REFRESH_DELAY секунд не больше SITEMAP_LOCK_MAX_RETRIES раз
+SITEMAP_LOCK_TIMEOUT = 60 * 60
+SITEMAP_LOCK_MAX_RETRIES = 60
+# выгрузка каталога в gzip NDJSON для офлайн-задач, отдается веб-сервером как статика
+CATALOG_SNAPSHOT_ROOT = os.path.join(MEDIA_ROOT, "snapshot")
+CATALOG_SNAPSHOT_FILE = "catalog.ndjson.gz"
+CATALOG_SNAPSHOT_PATH = "/media/snapshot/catalog.ndjson.gz"
+CATALOG_SNAPSHOT_CHUNK_SIZE = 1000
+# как часто (сек) celery beat пересобирает выгрузку
+CATALOG_SNAPSHOT_INTERVAL = 24 * 60 * 60
+# загруженные для импорта SEO по городам файлы, которые не применили, удаляются через столько секунд
+CITY_SEO_IMPORT_FILE_TTL = 24 * 60 * 60
+CELERY_BEAT_SCHEDULE = {
+    "update-sitemaps": {"task": "seo.tasks.build_sitemaps_task", "schedule": SITEMAP_UPDATE_INTERVAL},
+    "prune-change-log": {"task": "seo.tasks.prune_change_log_task", "schedule": 24 * 60 * 60},
+    "catalog-snapshot": {
+        "task": "apps.products.tasks.build_catalog_snapshot_task",
+        "schedule": CATALOG_SNAPSHOT_INTERVAL,
+    },
+    "sweep-city-seo-imports": {
+        "task": "apps.products.tasks.sweep_city_seo_import_files_task",
+        "schedule": 60 * 60,
+    },
+}
+
 
 ALLOWED_HOSTS = ["*"]
 
@@ -462,27 +547,92 @@ ALLOWED_HOSTS = ["*"]
 SITE_DOMAIN = "visota13.ru"
 FORMS_URLFIELD_ASSUME_HTTPS = True
 
-REST_FRAMEWORK = {"DEFAULT_RENDERER_CLASSES": ("rest_framework.renderers.JSONRenderer",)}
+REST_FRAMEWORK = {
+    "DEFAULT_RENDERER_CLASSES": ("rest_framework.renderers.JSONRenderer",),
+    # число прокси перед приложением; при 0 адрес клиента - REMOTE_ADDR, X-Forwarded-For не учитывается
+    "NUM_PROXIES": int(os.getenv("NUM_PROXIES", 0)),
+}
 
 
 # Recaptcha
-# RECAPTCHA_SECRET_KEY = os.getenv("RECAPTCHA_SECRET_KEY")
+RECAPTCHA_SECRET_KEY = os.getenv("RECAPTCHA_SECRET_KEY")
+RECAPTCHA_VERIFY_URL = "https://www.google.com/recaptcha/api/siteverify"
+# таймауты (сек) на соединение и ответ Google
+RECAPTCHA_CONNECT_TIMEOUT = 1
+RECAPTCHA_READ_TIMEOUT = 2
+RECAPTCHA_POOL_SIZE = 10
+# после стольких ошибок подряд Google не опрашивается RECAPTCHA_BREAKER_RESET секунд
+RECAPTCHA_BREAKER_THRESHOLD = 5
+RECAPTCHA_BREAKER_RESET = 30
+# принимать формы без проверки, пока Google недоступен
+RECAPTCHA_FAIL_OPEN = True
+# сколько (сек) помнить успешно проверенный токен
+RECAPTCHA_TOKEN_CACHE = "shared"
+RECAPTCHA_TOKEN_CACHE_TTL = 120
+
+# Заявки
+# принимать заявки в журнал на диске и отвечать 202, в базу они сохраняются пачками в celery
+REQUESTS_ASYNC_INGEST = os.getenv("REQUESTS_ASYNC_INGEST") == "1"
+REQUESTS_JOURNAL_DIR = os.path.join(BASE_DIR.parent, "journal", "requests")
+# заявки за это время (сек) сохраняются одной пачкой
+REQUESTS_INGEST_DELAY = 2
+REQUESTS_INGEST_BATCH_SIZE = 500
+# через сколько (сек) заявки упавшего воркера возвращаются в очередь
+REQUESTS_INGEST_STALE_AFTER = 10 * 60
+# страховочный разбор журнала celery beat, если задача из очереди потерялась
+CELERY_BEAT_SCHEDULE["ingest-requests"] = {"task": "apps.requests.tasks.ingest_submissions_task", "schedule": 60}
+# письма о заявках: адреса, окно сбора пачки (сек) и повторы с экспоненциальной паузой
+REQUESTS_MAIL_FROM = "d_mal@mail.ru"
+REQUESTS_MAIL_TO = ["d_mal@mail.ru"]
+REQUESTS_MAIL_DELAY = 10
+REQUESTS_MAIL_BATCH_SIZE = 100
+REQUESTS_MAIL_RETRY_DELAY = 30
+REQUESTS_MAIL_RETRY_MAX_DELAY = 60 * 60
+REQUESTS_MAIL_MAX_RETRIES = 10
+# письмо, которое не удалось собрать или которое отклонил сервер столько раз, больше не отправляется
+REQUESTS_MAIL_MAX_ATTEMPTS = 5
+# через столько секунд письма, взятые в отправку упавшим воркером, снова доступны для отправки
+REQUESTS_MAIL_CLAIM_TIMEOUT = 10 * 60
+# ответы на заявки с заголовком Idempotency-Key хранятся сутки
+REQUESTS_IDEMPOTENCY_CACHE = "shared"
+REQUESTS_IDEMPOTENCY_TTL = 24 * 60 * 60
+# сколько (сек) повтор считается параллельным еще не завершенному первому запросу
+REQUESTS_IDEMPOTENCY_LOCK_TIMEOUT = 30
+# ограничение частоты заявок до проверки данных: (запросов подряд, новых запросов в секунду);
+# ведро "ip" общее для всех форм, "phone" - свое у каждой формы
+REQUESTS_THROTTLE_RATES = {
+    "ip": (10, 1 / 30),
+    "phone": (3, 1 / 300),
+}
+REQUESTS_THROTTLE_COUNTERS_CACHE = "shared"
+# раз в столько секунд счетчики throttling переносятся из памяти процесса в кэш
+REQUESTS_THROTTLE_COUNTERS_FLUSH = 10
 
 
 PROJECT_LOGGING_DIR = os.path.join(BASE_DIR.parent, "logs")
 LOGGING = {
     "version": 1,
     "disable_existing_loggers": False,
-    "formatters": {"simple": {"format": "{process}-{thread} {levelname} {asctime} {message}", "style": "{"}},
+    "formatters": {
+        "simple": {"format": "{process}-{thread} {levelname} {asctime} {message}", "style": "{"},
+        "json": {"()": "common.log.JSONFormatter"},
+    },
+    "filters": {"correlation_id": {"()": "common.log.CorrelationIdFilter"}},
     "handlers": {
-        "forms.file": {
+        "forms_file": {
             "level": "INFO",
             "class": "logging.FileHandler",
             "filename": os.path.join(PROJECT_LOGGING_DIR, "forms.log"),
-            "formatter": "simple",
+            "formatter": "json",
+        },
+        # запись в файл в отдельном потоке, поток запроса только кладет запись в очередь
+        "forms_queue": {
+            "class": "common.log.QueueListenerHandler",
+            "handlers": ["cfg://handlers.forms_file"],
+            "filters": ["correlation_id"],
         },
     },
-    "loggers": {"visota.forms": {"handlers": ["forms.file"], "level": "INFO", "propogate": False}},
+    "loggers": {"visota.forms": {"handlers": ["forms_queue"], "level": "INFO", "propagate": False}},
 }
 
 